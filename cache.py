@@ -0,0 +1,86 @@
+# Generated histories, kept on disk under a hash of everything that went into generating them: the island, every event's
+#   resolved parameters (so after Simulation.resolve_event_dependencies and any reroll), the RNG seed and how the run was
+#   set up. Same key, same history, so GENERATE can load it instead of running the whole thing again.
+#   Only seeded runs are cached, since an unseeded one can never come out the same again.
+#
+# Every entry is a directory named by its key holding a record.MappedRecord (and keyframes, if any), so a hit costs about
+#   as much as mapping the files. Once the cache grows past max_bytes the least recently used entries get deleted.
+import hashlib
+import json
+import os
+import shutil
+
+class HistoryCache:
+	ROOT = 'cache/histories'
+	MAX_BYTES = 4 << 30
+
+	def __init__(self, root=ROOT, max_bytes=MAX_BYTES):
+		self.root = root
+		self.max_bytes = max_bytes
+		os.makedirs(self.root, exist_ok=True)
+
+	@staticmethod
+	def key(island, seed=None, **settings):
+		events = { event.name: {
+			'type': event.type_,
+			'curve': event.curve,
+			'params': { type_: [ param.value, param.unit, getattr(param, 'measured_time', None) ] for type_, param in sorted(event.params.items()) }
+		} for event in island.major_events }
+		material = json.dumps( { 'island': island.name, 'events': events, 'seed': seed, 'settings': settings }, sort_keys=True, default=str )
+		return hashlib.sha256( material.encode() ).hexdigest()
+
+	def path(self, key):
+		return os.path.join(self.root, key)
+
+	def __contains__(self, key):
+		return os.path.exists( os.path.join(self.path(key), 'record', 'years.npy') )
+
+	# (record, keyframes or None) for a key, or None on a miss
+	def get(self, key):
+		from history import Keyframes
+		from record import MappedRecord
+
+		if key not in self:
+			return None
+		path = self.path(key)
+		self.touch(key)
+		keyframes = os.path.join(path, 'keyframes.npz')
+		return MappedRecord.load( os.path.join(path, 'record') ), Keyframes.load(keyframes) if os.path.exists(keyframes) else None
+
+	def put(self, key, history):
+		from record import MappedRecord
+
+		# Written off to the side and renamed in so nobody ever sees half an entry
+		staging = f'{self.path(key)}.{os.getpid()}.tmp'
+		MappedRecord.save( history.record, os.path.join(staging, 'record') )
+		if history.keyframes is not None:
+			history.keyframes.save( os.path.join(staging, 'keyframes.npz') )
+		open( os.path.join(staging, 'used'), 'w' ).close()
+
+		shutil.rmtree(self.path(key), ignore_errors=True)
+		os.rename(staging, self.path(key))
+		self.evict(keep=key)
+
+	# Last use is the mtime of the entry's 'used' file
+	def touch(self, key):
+		os.utime( os.path.join(self.path(key), 'used') )
+
+	def size(self, key):
+		return sum( os.path.getsize( os.path.join(directory, name) ) for directory, _, names in os.walk(self.path(key)) for name in names )
+
+	def entries(self):
+		return [ key for key in os.listdir(self.root) if not key.endswith('.tmp') and os.path.exists( os.path.join(self.path(key), 'used') ) ]
+
+	# Deletes least recently used entries until everything fits in max_bytes. The entry just written is never evicted,
+	#   even if it's bigger than the whole budget on its own.
+	def evict(self, keep=None):
+		entries = sorted( self.entries(), key=lambda key: os.path.getmtime( os.path.join(self.path(key), 'used') ) )
+		sizes   = { key: self.size(key) for key in entries }
+		total   = sum(sizes.values())
+		for key in entries:
+			if total <= self.max_bytes:
+				break
+			if key == keep:
+				continue
+			shutil.rmtree(self.path(key), ignore_errors=True)
+			total -= sizes[key]
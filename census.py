@@ -0,0 +1,99 @@
+# The 2006 Samoa census (censuses/samoa_census_2006.xlsx), for checking reconstructed populations against.
+#
+# The spreadsheet is Table 2 of the census: population by region, faipule district and village, with just three age
+#   groups (<20, 20+ and ns for not stated) by sex. Regions, districts and villages are all plain rows one after the other,
+#   so telling them apart is down to the names in REGIONS. It's a bit messy too: the 20+ and ns Totals sit in column 8
+#   (and 12) on some rows and 7 (and 11) on others, and a '-' means nobody. Parsing it with openpyxl takes a moment, so
+#   it's done once and cached next to it as an .npz, and redone only if the spreadsheet changes.
+import os
+import numpy as np
+
+CENSUS = 'censuses/samoa_census_2006.xlsx'
+YEAR   = 2006 # CE
+
+REGIONS = ['Apia Urban Area', 'North West Upolu', 'Rest of Upolu', 'Savaii']
+# Which census regions make up each island in config.yaml
+ISLANDS = {
+	'Upolu': ['Apia Urban Area', 'North West Upolu', 'Rest of Upolu'],
+	"Savai'i": ['Savaii']
+}
+
+# Age groups the census reports, and where they split
+BRACKETS = ['<20', '20+', 'ns']
+EDGES    = [20]
+
+class Census:
+	# names lines up with counts, which is (rows, BRACKETS, sex) with sex 0 == female and 1 == male like everywhere else
+	def __init__(self, names, counts, year=YEAR):
+		self.names  = np.asarray(names, dtype=str)
+		self.counts = np.asarray(counts, dtype=np.int64)
+		self.year   = year
+
+	@classmethod
+	def load(cls, path=CENSUS):
+		cache = f'{os.path.splitext(path)[0]}.npz'
+		if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+			with np.load(cache) as data:
+				return cls(data['names'], data['counts'])
+
+		census = cls.parse(path)
+		np.savez_compressed(cache, names=census.names, counts=census.counts)
+		return census
+
+	@classmethod
+	def parse(cls, path=CENSUS):
+		import openpyxl
+
+		def count(value):
+			return 0 if value in (None, '-') else int(value)
+
+		names, counts = [], []
+		workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+		# Title and three header rows first. The Totals of the last two groups move around, but Male and Female don't.
+		for row in workbook.worksheets[0].iter_rows(min_row=5, values_only=True):
+			if row[0] is None:
+				continue
+			names.append( row[0].strip() )
+			counts.append( [ [ count(row[6]), count(row[5]) ], [ count(row[10]), count(row[9]) ], [ count(row[14]), count(row[13]) ] ] )
+		workbook.close()
+		return cls(names, counts)
+
+	# (BRACKETS, sex) counts for an island in config.yaml, or any row of the census by name ('Samoa' is the whole country)
+	def table(self, name):
+		return self.counts[ [ self.row(region) for region in ISLANDS.get(name, [name]) ] ].sum(axis=0)
+
+	# Village names repeat (there are three Vailoas), so this is the first row by that name
+	def row(self, name):
+		rows = np.flatnonzero(self.names == name)
+		if len(rows) == 0:
+			raise KeyError(name)
+		return int(rows[0])
+
+	# How far a reconstructed population is from the census in every one of years, as (years, size distance, pyramid
+	#   distance). Size distance is the relative difference in head count. Pyramid distance is the total variation
+	#   distance between the age/sex makeups, so 0 is identical and 1 is nothing in common. Everyone whose age wasn't
+	#   stated is left out of the pyramid, but not the size.
+	def compare(self, history, name, years=None):
+		index = history.lifespans
+		if years is None:
+			years = np.arange( int(index.births.min()), int(index.births.max()) + 1 )
+		years = np.asarray(years, dtype=np.int64)
+
+		census    = self.table(name)
+		simulated = index.pyramids(years, EDGES).astype(np.float64)
+
+		size = np.abs( simulated.sum(axis=(1, 2)) - census.sum() ) / census.sum()
+		stated = census[:len(EDGES) + 1].astype(np.float64)
+		shares = simulated / np.maximum( simulated.sum(axis=(1, 2), keepdims=True), 1 )
+		pyramid = np.abs( shares - stated / stated.sum() ).sum(axis=(1, 2)) / 2
+		# Nobody alive at all is as far off as it gets
+		pyramid[ simulated.sum(axis=(1, 2)) == 0 ] = 1
+		return years, size, pyramid
+
+	# The year whose reconstructed population looks most like the census, weighing size and pyramid distance by
+	#   size_weight and 1 - size_weight. Returns (year, score).
+	def best_year(self, history, name, years=None, size_weight=0.5):
+		years, size, pyramid = self.compare(history, name, years)
+		scores = size_weight * size + ( 1 - size_weight ) * pyramid
+		best = int( np.argmin(scores) )
+		return int(years[best]), float(scores[best])
@@ -2,7 +2,10 @@ from enum import Enum
 import random
 import matplotlib.pyplot as plt
 import numpy as np
-import scipy.stats as stats
+from record import VitalRecord, NO_SEX
+
+# The number of seconds in a Julian year
+JULIAN_YEAR = 86400 * 365.25
 
 class EventType(Enum):
 	BIRTH, DEATH, PREG = range(3)
@@ -18,16 +21,66 @@ class Event:
 			assert 'sex' in additional_values
 			self.sex   = additional_values['sex'] 
 
-		self.value = exact_moment if exact_moment is not None else random.uniform(0,1) * 86400 * 365.25 # The number of seconds in a Julian year
+		self.value = exact_moment if exact_moment is not None else random.uniform(0,1) * JULIAN_YEAR
+
+
+
+# Hands out the random numbers a History needs. Drawing them one at a time (and building a frozen scipy distribution for
+#   every single pregnancy) was most of the cost of recording an event, so instead these come out of big numpy blocks
+#   that get refilled as they run out. The distributions are the same as they always were:
+#
+#     pregnancy length  normal with mean 266 days and sigma 16 days, in seconds. Comes from
+#                       http://hawaii.hawaii.edu/math/Courses/Math100/Chapter4/Notes/Exercises/Demo434.htm 
+#     exact moment      uniform over a Julian year, in seconds
+#     year offset       uniform over -4 .. -1, i.e. random.randrange(yr - 4, yr) - yr
+class TimingSampler:
+	PREGNANCY_LENGTH_MEAN  = 266 #days
+	PREGNANCY_LENGTH_SIGMA = 16  #days
+
+	def __init__(self, block=1 << 16, rng=None):
+		self.block = block
+		self.rng   = rng if rng is not None else np.random.default_rng()
+		self.draws = {
+			'pregnancy_length': lambda n: self.rng.normal( self.PREGNANCY_LENGTH_MEAN * 86400, self.PREGNANCY_LENGTH_SIGMA * 86400, size=n ),
+			'moment':           lambda n: self.rng.uniform( 0, 1, size=n ) * JULIAN_YEAR,
+			'year_offset':      lambda n: self.rng.integers( -4, 0, size=n )
+		}
+		self.blocks  = { name: draw(0) for name, draw in self.draws.items() }
+		self.cursors = dict.fromkeys(self.draws, 0)
+
+	def take(self, name, n):
+		block, cursor = self.blocks[name], self.cursors[name]
+		if cursor + n > len(block):
+			block  = np.concatenate( ( block[cursor:], self.draws[name]( max(self.block, n) ) ) )
+			cursor = 0
+			self.blocks[name] = block
+		self.cursors[name] = cursor + n
+		return block[cursor:cursor + n]
 
+	def pregnancy_lengths(self, n):
+		return self.take('pregnancy_length', n)
 
+	def moments(self, n):
+		return self.take('moment', n)
+
+	def year_offsets(self, n):
+		return self.take('year_offset', n)
 
 class History:
 	# TODO month offsets like what does it mean to be born in December? 
-	def __init__(self, pop, y0):
-		self.record = {}
+	#
+	# record is a VitalRecord (see record.py). record[year][person_id] still gives a list of Events.
+	# sink is where events go as they're recorded, see the end of record.py. Anything but the default VitalRecord
+	#   means the events aren't kept around, so reconstructing or seeking a population won't work off it.
+	# Timing draws come from the population's rng, so one stream (see streams.py) covers the whole run.
+	def __init__(self, pop, y0, sink=None):
+		self.record = VitalRecord() if sink is None else sink
+		self.timing = TimingSampler(rng=pop.rng)
 		self.current_year  = y0
 		self.starting_year = y0
+		self.keyframes = None
+		# Population size at the end of every year run so far, sizes[i] being starting_year + i
+		self.sizes = []
 		self.pop = pop
 		if len(pop) > 0:
 			self.initial_births()
@@ -35,9 +88,11 @@ class History:
 	# This can be used to generate birth events for any members of a population (so, every individual that comes from a major event,
 	#   which is to say every individual I'm using lol) that don't already have them. This won't generate duplicate birth events
 	#   (or at least it shouldn't), so I'm just gonna be calling it after every major event with a population change.
-	def initial_births(self):
-		for i in self.pop:
-			self.record_event(EventType.BIRTH, i.id, self.current_year - i.age)
+	#
+	# Pass people (a Population) to only record births for them, e.g. the arrivals of a population change.
+	def initial_births(self, people=None):
+		ids, ages, sexes = ( self.pop if people is None else people ).arrays()
+		self.record_events(EventType.BIRTH, ids, self.current_year - ages.astype(np.int64), sexes=sexes)
 
 	def run(self, runtime, verbose=False):
 		# So the first iteration will be y0, and over the course of this year we'll see births and deaths. 
@@ -53,19 +108,22 @@ class History:
 		y0 = self.current_year 
 		for yr in range(runtime):
 			if verbose and (y0 + yr) % 50 == 0:
-				print(f'{y0 + yr} {"CE" if y0 + yr >= 0 else "BCE"}\t{len(self.pop)}')
+				print(f'{y0 + yr} {"CE" if y0 + yr >= 0 else "BCE"}\t{len(self.pop)}\t(target {round(self.pop.growth)})')
+			if verbose:
+				print(f'\t{y0 + yr}\t{self.pop.pyramid_str()}')
 			results = self.pop.elapse_year()
-			for person_id in results['deaths']:
-				yod = y0 + random.randrange(yr - 4, yr) # Year of death
-				self.record_event( EventType.DEATH, person_id, yod )
-			for birth in results['births']:
-				yob = y0 + random.randrange(yr - 4, yr) # Year of birth
-				self.record_event( EventType.BIRTH, birth['id'], yob, sex=birth['sex'] )
+			deaths  = results['deaths']
+			yods    = y0 + yr + self.timing.year_offsets(len(deaths)) # Years of death
+			self.record_events( EventType.DEATH, deaths, yods )
+			births  = results['births']
+			yobs    = y0 + yr + self.timing.year_offsets(len(births['id'])) # Years of birth
+			self.record_events( EventType.BIRTH, births['id'], yobs, sexes=births['sex'] )
+			self.sizes.append( len(self.pop) )
 			
 			self.current_year += 1
 
 		self.recorded_years  = len(self.record)
-		self.recorded_events = sum(list(map(lambda key: len(self.record[key]), self.record.keys())))
+		self.recorded_events = self.record.event_count
 
 
 	# Questions of timekeeping...
@@ -81,114 +139,263 @@ class History:
 	#   every year recorded here is a Julian year, taken as 86400 seconds * 365.25 days exactly. When we go to run the simulation itself we'll start 
 	#   at like 4000 BCE or whatever and let the celestial bodies move in the way they do, and after like 3000 Julian years minus however many
 	#   to accommodate the entire vital record we'll just start running the history. So for now abstracting away celestial bodies.
+	#
+	# Same fallback as Event for the exact moment. Only births keep a sex.
 	def record_event(self, event_type, iid, year, exact_moment=None, sex=None):
-		ev = Event(event_type, iid, year, exact_moment=exact_moment, sex=sex)
+		self.record_events( event_type, np.array([iid]), np.array([year]), sexes=None if sex is None else np.array([sex]), exact_moments=None if exact_moment is None else np.array([exact_moment]) )
 
-		if year not in self.record:
-			self.record[year] = {} 
+	# record_event for whole arrays of people at once. years lines up with ids, and so do sexes and exact_moments if given.
+	def record_events(self, event_type, ids, years, sexes=None, exact_moments=None):
+		count   = len(ids)
+		moments = exact_moments if exact_moments is not None else self.timing.moments(count)
+		if event_type != EventType.BIRTH or sexes is None:
+			sexes = np.full(count, NO_SEX, dtype=np.int8)
 
-		# Corner case of babies dying the year they're born, which feels like it could happen lol. 
-		if ev.id not in self.record[year]: 
-			self.record[year][ev.id] = [ev]
-		else:
-			self.record[year][ev.id].append(ev)
+		# A person can have more than one row in a year, e.g. the corner case of babies dying the year they're born, which feels like it could happen lol. 
+		self.extend_record( years, ids, np.full(count, event_type.value, dtype=np.int8), moments, sexes )
 
 		# Anyone not born on the island (or I guess close enough to being on the island?) doesn't get an
 		#   an associated pregnancy event. Probably help make that starting data for the "before times" 
 		#   a little less goofy to deal with in the future. 
-		if ev.type_ == EventType.BIRTH and ev.year > self.starting_year:
-			# Comes from
-			# http://hawaii.hawaii.edu/math/Courses/Math100/Chapter4/Notes/Exercises/Demo434.htm 
-			PREGNANCY_LENGTH_MEAN = 266 #days
-			PREGNANCY_LENGTH_SIGMA = 16 #days
-			preg_value = stats.norm( loc = PREGNANCY_LENGTH_MEAN * 86400, scale = PREGNANCY_LENGTH_SIGMA * 86400 ).rvs()
-			self.record_event(EventType.PREG, iid, year if ev.value - preg_value < 0 else year - 1, exact_moment=preg_value)
-		
+		if event_type == EventType.BIRTH:
+			native = years > self.starting_year
+			preg_values = self.timing.pregnancy_lengths( int(np.count_nonzero(native)) )
+			preg_years  = np.where( moments[native] - preg_values < 0, years[native], years[native] - 1 )
+			self.extend_record( preg_years, ids[native], np.full(len(preg_values), EventType.PREG.value, dtype=np.int8), preg_values, np.full(len(preg_values), NO_SEX, dtype=np.int8) )
+
+	# Files parallel columns of events under their years
+	def extend_record(self, years, ids, types, moments, sexes):
+		for year in np.unique(years).tolist():
+			rows = years == year
+			self.record.extend( year, ids[rows], types[rows], moments[rows], sexes[rows] )
 
+	# These come straight off the record's running tallies
 	def target_births(self, year):
-		return len(list(filter(lambda key: self.record[year][key].type_ == EventType.BIRTH, self.record[year].keys())))
+		return self.record.tallies(year, EventType.BIRTH.value)
 
 	def target_deaths(self, year):
-		return len(list(filter(lambda key: self.record[year][key].type_ == EventType.DEATH, self.record[year].keys())))
+		return self.record.tallies(year, EventType.DEATH.value)
+
+	def target_pregnancies(self, year):
+		return self.record.tallies(year, EventType.PREG.value)
 
 	def growth_plot(self):
-		years = list(self.record.keys())
-		growth_rates = list(map(lambda year: self.target_births(year) - self.target_deaths(year), years))
+		tallies = self.record.tallies
+		years = tallies.years
+		growth_rates = tallies.column(EventType.BIRTH.value) - tallies.column(EventType.DEATH.value)
 
 		theta = np.polyfit(years, growth_rates, 1)
-		y_line = theta[1] + theta[0] * np.array(years)
+		y_line = theta[1] + theta[0] * years
 
 		plt.scatter(years, growth_rates)
 		plt.plot(years, y_line, 'r')
 
 		plt.show()
 
-	# TODO these don't work yet
 	def advance_population(self, by=1):
 		self.reconstruct_population(self.current_year + by, mode='MODIFY')
 
 	def rewind_population(self, by=1):
 		self.reconstruct_population(self.current_year - by, mode='MODIFY')
 
+	# Who was born and died when, indexed for alive-in-year questions. Built from the record on first use, and rebuilt
+	#   whenever the record has picked up more events since.
+	@property
+	def lifespans(self):
+		if getattr(self, '_lifespans', None) is None or self._lifespans.event_count != self.record.event_count:
+			self._lifespans = LifespanIndex.from_record(self.record)
+		return self._lifespans
+
+	# Snapshot who's alive every `every` years so seeking only replays the births and deaths since the nearest one.
+	#   Worth it for records that get seeked around a lot, or that are imported without wanting to rebuild anything.
+	def build_keyframes(self, every=50):
+		self.keyframes = Keyframes.from_index(self.lifespans, every)
+		return self.keyframes
+
+	# (ids, years of birth, sexes) of everyone alive in year, from the keyframes if they're still current
+	def alive(self, year):
+		if self.keyframes is not None and self.keyframes.event_count == self.record.event_count:
+			return self.keyframes.alive(year)
+		index = self.lifespans
+		rows  = index.alive_rows(year)
+		return index.ids[rows], index.births[rows], index.sexes[rows]
+
 	# This method attempts to answer the question "who was alive during a given (julian) year?"
 	# In the current savai'i record, 1674 is when the pop most closely resembles sav pop in 2006. Cool! 
+	#
+	# NEW_POP builds a fresh SIMULATED Population. MODIFY adds and kills people in the current one until it matches,
+	#   which works in either direction and only touches the people who differ between the two years. The current one
+	#   has to be SIMULATED for that, so e.g. right after a history run or an import MODIFY does a NEW_POP instead.
 	def reconstruct_population(self, year, mode='NEW_POP'):
 		from soc import Population, Individual, PopulationType
 
-		def advance_to(pop, year):
-			# The number of people alive during any given year is a function of
-			#   who has been 'recently' born but hasn't yet died. 100 is a 
-			#   nice round number that is also longer than I'm letting anyone
-			#   actually live in this (for now anyway mua-ha-ha!).
-			for i in range(year - 100, year + 1):
-				for event_set in self.record[i].values():
-					for event in event_set:
-						if event.type_ == EventType.BIRTH:
-							pop[event.id] = Individual(id=event.id, yob=event.year, pop=pop, sex=event.sex if hasattr(event, 'sex') else None)
-						elif event.type_ == EventType.DEATH and pop[event.id] is not None:
-							pop.kill(event.id)
-
-			return pop
-
-		def find_birth(event):
-			for i in range(event.year - 100, event.year + 1):
-				try:
-					for e in self.record[i][event.id]:
-						if e.type_ == EventType.BIRTH:
-							return e
-				except KeyError:
-					pass
+		ids, yobs, sexes = self.alive(year)
+		if self.pop.mode != PopulationType.SIMULATED:
+			mode = 'NEW_POP'
 
 		# Currently to say we are moving to a year is more like to the end of that year when all is said and done. 
 		match mode:
 			case 'NEW_POP':
 				pop = Population(mode=PopulationType.SIMULATED)
-				advance_to(pop, year)
 				self.pop = pop
 			case 'MODIFY':
-				import warnings
-				warnings.warn('This does not work as expected right now. See comments and maybe don\'t use it :)') 
-				# TODO this does not return the same result as if I just reconstructed the population for that year. 
-				#   I might move on for now considering this is more a curiosity than anything else at this 
-				#   point. 
-				delta = year - self.current_year 
-				if delta > 0:
-					advance_to(self.pop, year)
-				elif delta < 0:
-					# The last thing we undo will be the year after our target year, 
-					#   and the first thing we undo will be the current_year. 
-					for i in reversed(range(year + 1, self.current_year + 1)):
-						for event_set in self.record[i].values():
-							for event in event_set:
-								if event.type_ == EventType.BIRTH:
-									self.pop.kill(event.id)
-								elif event.type_ == EventType.DEATH:
-									birth = find_birth(event)
-									self.pop[event.id] = Individual(id=event.id, yob=birth.year, pop=self.pop, sex=birth.sex)
+				current = np.array( list(self.pop.index), dtype=np.int64 )
+				for pid in np.setdiff1d( current, ids ).tolist():
+					self.pop.kill(pid)
+				new = ~np.isin( ids, current )
+				ids, yobs, sexes = ids[new], yobs[new], sexes[new]
 
+		for pid, yob, sex in zip(ids.tolist(), yobs.tolist(), sexes.tolist()):
+			self.pop[pid] = Individual(age=year - yob, id=pid, yob=yob, sex=None if sex == NO_SEX else sex)
 
 		for p in self.pop:
-			p.set_age(year - p.yob) 
+			self.pop.set_age(p, year - p.yob) 
 				
 		self.current_year = year
 
+# An interval index over everyone's lifespan: born in births[i], died in deaths[i] (or never, as far as the record knows).
+#   Someone counts as alive in year Y if they were born by the end of Y and hadn't died by then, the same rule
+#   reconstruct_population always used.
+#
+# People are kept sorted by year of birth. Nobody lives longer than max_lifespan, so everyone alive in Y was born in
+#   (Y - max_lifespan, Y] and two binary searches narrow it down to them. The people with no death on record are kept
+#   separately since that bound doesn't hold for them. Counting doesn't even need that, it's births so far minus deaths so far.
+class LifespanIndex:
+	ALIVE = np.iinfo(np.int64).max
+
+	def __init__(self, ids, births, deaths, sexes, event_count=0):
+		order = np.argsort(births, kind='stable')
+		self.ids, self.births, self.deaths, self.sexes = ids[order], births[order], deaths[order], sexes[order]
+		self.event_count = event_count
+
+		dead = self.deaths != self.ALIVE
+		self.max_lifespan = int( ( self.deaths[dead] - self.births[dead] ).max() ) if dead.any() else 0
+		self.immortal = np.flatnonzero(~dead)
+
+		self.sorted_deaths = np.sort(self.deaths[dead])
+
+	@classmethod
+	def from_record(cls, record):
+		frame = record.frame()
+
+		births = frame['type'] == EventType.BIRTH.value
+		# First birth row per person, in case anyone was recorded twice
+		ids, first = np.unique( frame['id'][births], return_index=True )
+		birth_years = frame['year'][births][first]
+		sexes = frame['sex'][births][first]
+
+		deaths = frame['type'] == EventType.DEATH.value
+		death_years = np.full(len(ids), cls.ALIVE, dtype=np.int64)
+		where = np.searchsorted( ids, frame['id'][deaths] )
+		known = ( where < len(ids) ) & ( ids[ np.minimum(where, len(ids) - 1) ] == frame['id'][deaths] ) if len(ids) > 0 else np.zeros(0, dtype=bool)
+		np.minimum.at( death_years, where[known], frame['year'][deaths][known] )
+
+		return cls(ids, birth_years, death_years, sexes, event_count=record.event_count)
+
+	def __len__(self):
+		return len(self.ids)
+
+	# Positions (into self.ids, self.births, ...) of everyone alive at some point in [start, end]
+	def alive_rows_between(self, start, end):
+		low  = np.searchsorted( self.births, start - self.max_lifespan, side='right' )
+		high = np.searchsorted( self.births, end, side='right' )
+		rows = np.arange(low, high)
+		rows = rows[ self.deaths[rows] > start ]
+		return np.union1d( rows, self.immortal[ self.births[self.immortal] <= end ] )
+
+	def alive_rows(self, year):
+		return self.alive_rows_between(year, year)
+
+	def alive_at(self, year):
+		return self.ids[ self.alive_rows(year) ]
+
+	def alive_between(self, start, end):
+		return self.ids[ self.alive_rows_between(start, end) ]
+
+	# Works on a single year or a whole array of them
+	def count_alive(self, year):
+		return np.searchsorted( self.births, year, side='right' ) - np.searchsorted( self.sorted_deaths, year, side='right' )
+
+	# How many people of each sex were alive in each of years, split into age brackets at edges (e.g. [20] for under and
+	#   over 20). Comes back shaped (years, brackets, sex). Every year at once: someone is in bracket [low, high) for the
+	#   years [birth + low, min(death, birth + high)), so each person adds 1 where that starts and takes it away where it
+	#   stops, and a cumulative sum over the years does the rest.
+	def pyramids(self, years, edges):
+		years = np.asarray(years, dtype=np.int64)
+		first, span = int(years.min()), int(years.max() - years.min()) + 1
+		bounds = [0, *edges, None]
+		known  = self.sexes != NO_SEX
+		births, deaths, sexes = self.births[known], self.deaths[known], self.sexes[known].astype(np.int64)
+
+		out = np.zeros((span, len(bounds) - 1, 2), dtype=np.int64)
+		for k, (low, high) in enumerate( zip(bounds[:-1], bounds[1:]) ):
+			start = births + low
+			stop  = deaths if high is None else np.minimum(deaths, births + high)
+			# Died before ever reaching this bracket
+			stop  = np.maximum(start, stop)
+			start, stop = np.clip(start, first, first + span) - first, np.clip(stop, first, first + span) - first
+			steps = np.bincount( start * 2 + sexes, minlength=(span + 1) * 2 ) - np.bincount( stop * 2 + sexes, minlength=(span + 1) * 2 )
+			out[:, k] = np.cumsum( steps.reshape(-1, 2), axis=0 )[:span]
+		return out[ years - first ]
+
+# Everyone alive every `every` years (the keyframes), plus every birth and death sorted by year (the deltas). Seeking to a
+#   year starts from the last keyframe at or before it and applies at most `every` years of deltas. Years before the
+#   first keyframe start from nobody at all.
+#
+# Keyframes are stored flat: frame k is ids[offsets[k]:offsets[k+1]] and so on, taken at the end of years[k].
+class Keyframes:
+	FIELDS = ['every', 'event_count', 'years', 'offsets', 'ids', 'yobs', 'sexes',
+			  'birth_ids', 'birth_years', 'birth_sexes', 'death_ids', 'death_years']
+
+	def __init__(self, **arrays):
+		for field in self.FIELDS:
+			setattr(self, field, arrays[field])
+		self.every, self.event_count = int(self.every), int(self.event_count)
+
+	@classmethod
+	def from_index(cls, index, every=50):
+		start = int(index.births.min()) if len(index) > 0 else 0
+		end   = int(index.births.max()) if len(index) > 0 else 0
+		years = np.arange(start - start % every, end + 1, every, dtype=np.int64)
+
+		frames  = [ index.alive_rows(year) for year in years ]
+		rows    = np.concatenate(frames) if frames else np.empty(0, dtype=np.int64)
+		offsets = np.concatenate(( [0], np.cumsum( list(map(len, frames)) ) )).astype(np.int64)
+
+		# births are already sorted by year in the index
+		dead  = np.flatnonzero( index.deaths != index.ALIVE )
+		order = dead[ np.argsort(index.deaths[dead], kind='stable') ]
+
+		return cls(every=every, event_count=index.event_count, years=years, offsets=offsets,
+				   ids=index.ids[rows], yobs=index.births[rows], sexes=index.sexes[rows],
+				   birth_ids=index.ids, birth_years=index.births, birth_sexes=index.sexes,
+				   death_ids=index.ids[order], death_years=index.deaths[order])
+
+	def save(self, path):
+		np.savez_compressed( path, **{ field: getattr(self, field) for field in self.FIELDS } )
+
+	@classmethod
+	def load(cls, path):
+		with np.load(path) as data:
+			return cls( **{ field: data[field] for field in cls.FIELDS } )
+
+	# (ids, years of birth, sexes) of everyone alive in year
+	def alive(self, year):
+		k = np.searchsorted( self.years, year, side='right' ) - 1
+		if k >= 0:
+			frame = slice( self.offsets[k], self.offsets[k + 1] )
+			ids, yobs, sexes = self.ids[frame], self.yobs[frame], self.sexes[frame]
+			since = self.years[k]
+		else:
+			ids, yobs, sexes = ( np.empty(0, dtype=np.int64), ) * 2 + ( np.empty(0, dtype=np.int8), )
+			since = np.iinfo(np.int64).min
+
+		born = slice( *np.searchsorted( self.birth_years, [since, year], side='right' ) )
+		died = slice( *np.searchsorted( self.death_years, [since, year], side='right' ) )
+
+		ids   = np.concatenate(( ids, self.birth_ids[born] ))
+		yobs  = np.concatenate(( yobs, self.birth_years[born] ))
+		sexes = np.concatenate(( sexes, self.birth_sexes[born] ))
+
+		keep = ~np.isin( ids, self.death_ids[died] )
+		return ids[keep], yobs[keep], sexes[keep]
@@ -1,17 +1,18 @@
 from parameter import Parameter
 from history import History
-from soc import Population
+from soc import Population, PopulationType, IdAllocator
 
 # One of these modifies the way a Population grows.
 class MajorEvent:
-	def __init__(self, name, type_, parameters, curve=None, verbose=False):
+	# rng is the island's parameter stream, see streams.py
+	def __init__(self, name, type_, parameters, curve=None, verbose=False, rng=None):
 		self.name = name
 		self.type_ = type_
 
 		if verbose:
 			print(f'\t{self.name}')
 
-		self.params = { p.type_: p for p in [ Parameter(**param, verbose=verbose) for param in parameters ] }
+		self.params = { p.type_: p for p in [ Parameter(**param, verbose=verbose, rng=rng) for param in parameters ] }
 		if self.year.value is not None and self.year.value < 0:
 			self.reroll_year()
 		self.reset_dependency_check()
@@ -58,13 +59,21 @@ class Island(Process):
 	THIS_YEAR = 2020 # CE
 	END_YEAR  = 1866 # CE
 
-	def __init__(self, name, events={}, verbose=False):
+	KEYFRAME_INTERVAL = 50 # years between population snapshots, see history.Keyframes
+
+	# seed and replicate pick this island's random streams (see streams.py), and are part of the history cache key.
+	#   No seed means fresh entropy every time.
+	def __init__(self, name, events={}, verbose=False, seed=None, replicate=0):
+		from streams import generator, PARAMETERS
 		super(Island, self).__init__()
 		self.id = str( uuid.uuid4() )
 		self.name = name
+		self.seed = seed
+		self.replicate = replicate
+		self.rng = generator(seed, name, PARAMETERS, replicate)
 		if verbose:
 			print(f'{self.name} parameters:')
-		self.events = { e.name: e for e in [ MajorEvent(**event, verbose=verbose) for event in events ] }
+		self.events = { e.name: e for e in [ MajorEvent(**event, verbose=verbose, rng=self.rng) for event in events ] }
 
 		#self.topo = Topography().belongs_to(self)  
 
@@ -84,60 +93,177 @@ class Island(Process):
 		import sys
 		sys.stdout = open(f'logs/{self.name}', 'w') 
 		
-		# 2. Load history
+		# 2. Load history, from the cache when these exact parameters and seed have been run before. Unseeded runs are
+		#   never the same twice, so they neither use the cache nor fill it up.
+		from cache import HistoryCache
+		cache  = HistoryCache()
+		key    = self.cache_key()
+		cached = self.seed is not None and self.load_cached_history(cache, key)
 		match self.history_mode:
 			case 'IMPORT':
-				self.import_vital_record()
+				if not cached:
+					if self.seed is not None:
+						print('No cached history for the current parameters, histories/ may be stale')
+					self.import_vital_record()
 			case 'GENERATE': 
-				self.history_preflight(verbose=True)
+				if not cached:
+					self.history_preflight(verbose=True, keyframe_interval=self.KEYFRAME_INTERVAL)
+					if self.seed is not None:
+						cache.put(key, self.history)
 		
-		self.server.send(f'{self.name} has {len(self.vital_record)} years to playback') 
+		# 3. Hand the record to the Shell through shared memory, see record.share_record
+		from record import share_record
+		self.server.send({
+			'island': self.name,
+			'message': f'{self.name} has {len(self.vital_record)} years to playback',
+			'record': share_record(self.vital_record)
+		})
+
+	def cache_key(self, starting_year=-1000, population_mode=PopulationType.HISTORICAL):
+		from cache import HistoryCache
+		return HistoryCache.key(self, self.seed, replicate=self.replicate, starting_year=starting_year, population_mode=population_mode, keyframe_interval=self.KEYFRAME_INTERVAL)
+
+	def load_cached_history(self, cache, key, starting_year=-1000):
+		cached = cache.get(key)
+		if cached is None:
+			return False
+		print(f'Loading cached history {key}')
+		self.history = History(Population(0), starting_year)
+		self.history.record, self.history.keyframes = cached
+		return True
 
 	def bind_multiprocessing_communication_channels(self, **kwargs):
 		for key, value in kwargs.items():
 			setattr(self, key, value)
 
 	# So testing runs a little faster, hopefully!
-	def export_vital_record(self):
-		import csv
-		from history import EventType
-		with open(f'histories/{self.name}.csv', 'w') as f:
-			writer = csv.writer(f)
-
-			header = ['year', 'person_id', 'type', 'exact_moment', 'sex (if applicable)']
-			writer.writerow(header)
-			for year, event_dict in self.vital_record.items():
-				for person_id, events in event_dict.items():
-					for event in events:
-						writer.writerow([year, person_id, f'{event.type_.name}-{event.type_.value}', event.value, event.sex if event.type_ == EventType.BIRTH else ''])
-
-	def import_vital_record(self, starting_year=-1000):
-		import csv
-		from history import Event, EventType
-		with open(f'histories/{self.name}.csv', 'r') as f:
-			reader = csv.DictReader(f)
-			out = {} 
-			for row in reader:
-				year = int(row['year'])
-				if year not in out:
-					out[year] = {}
-
-				person_id = row['person_id']
-				if person_id not in out[year]:
-					out[year][person_id] = []  
-
-				_, type_id = row['type'].split('-')
-				sex = row['sex (if applicable)']
-				out[year][person_id].append( Event( EventType( int( type_id ) ), person_id, year, exact_moment=float( row['exact_moment'] ), sex=int(sex) if sex != '' else None ) )
-
-			self.history = History(Population(0), starting_year) 
-			self.history.record = out
-
-	def history_preflight(self, starting_year=-1000, verbose=False): # 1000 BCE start by default
-		def actual_year(year):
-			if year.unit == "CE":
-				return year.value
-			return self.THIS_YEAR - year.convert("years ago")
+	# By default this writes the binary format in record.MappedRecord to histories/{name}.record/, which imports by
+	#   mapping the files instead of parsing them. format='csv' writes histories/{name}.csv instead, for other tools,
+	#   and format='archive' a compressed record.save_archive to histories/{name}.archive/ for keeping around.
+	# Person ids in the csv are the island's integer ids, unless uuids is set. Files with UUIDs can't be read back, so they
+	#   go to histories/{name}.uuids.csv instead, where import_vital_record won't pick them up.
+	# Keyframes, if the history has any, go next to either one as histories/{name}.keyframes.npz
+	def export_vital_record(self, uuids=False, format='binary'):
+		from record import MappedRecord
+		from record import save_archive
+		match format:
+			case 'binary':
+				MappedRecord.save(self.vital_record, f'histories/{self.name}.record')
+			case 'archive':
+				save_archive(self.vital_record, f'histories/{self.name}.archive')
+			case _:
+				self.export_vital_record_csv(uuids)
+
+		if self.history.keyframes is not None and not uuids:
+			self.history.keyframes.save(f'histories/{self.name}.keyframes.npz')
+
+	def csv_path(self, uuids=False):
+		return f'histories/{self.name}.uuids.csv' if uuids else f'histories/{self.name}.csv'
+
+	def export_vital_record_csv(self, uuids=False):
+		from record import RecordWriter
+		writer = RecordWriter(self.csv_path(uuids), uuid=self.ids.uuid if uuids else None)
+		for year in sorted(self.vital_record):
+			columns = self.vital_record.columns(year)
+			writer.extend(year, columns['id'], columns['type'], columns['moment'], columns['sex'])
+		writer.close()
+
+	# Reads whichever of the binary record, the archive and the csv was written last.
+	# years is an optional (first, last) window, inclusive, to only load those years. Remember reconstruct_population
+	#   looks back 100 years for anyone still alive, so start the window at least that far before the first year you
+	#   want to play back. Either format only reads what's inside the window, using its year index.
+	def import_vital_record(self, starting_year=-1000, years=None):
+		import os
+		from history import Keyframes
+		from record import MappedRecord, load_archive
+		written = { format: os.path.getmtime(marker) for format, marker in [ ('binary', f'histories/{self.name}.record/years.npy'),
+				('archive', f'histories/{self.name}.archive/index.npy'), ('csv', f'histories/{self.name}.csv') ] if os.path.exists(marker) }
+		match max(written, key=written.get, default='csv'):
+			case 'binary':
+				self.history = History(Population(0), starting_year)
+				self.history.record = MappedRecord.load(f'histories/{self.name}.record', years=years)
+			case 'archive':
+				self.history = History(Population(0), starting_year)
+				self.history.record = load_archive(f'histories/{self.name}.archive', years=years)
+			case 'csv':
+				self.import_vital_record_csv(starting_year, years=years)
+
+		keyframes = f'histories/{self.name}.keyframes.npz'
+		if os.path.exists(keyframes):
+			self.history.keyframes = Keyframes.load(keyframes)
+
+	# A window only reads its own rows if the csv has a year index, which export_vital_record writes. Streamed csvs
+	#   don't have one and get read in full.
+	def import_vital_record_csv(self, starting_year=-1000, years=None):
+		from record import read_csv
+		self.history = History(Population(0), starting_year) 
+		self.history.record = read_csv(f'histories/{self.name}.csv', years=years)
+
+	def actual_year(self, year):
+		if year.unit == "CE":
+			return year.value
+		return self.THIS_YEAR - year.convert("years ago")
+
+	# [ (lower, upper, event) ] for every epoch from starting_year to END_YEAR. event is None when nothing happens at lower.
+	def timeline(self, starting_year=-1000):
+		timeline_dict = { self.actual_year(ev.year): ev for ev in self.major_events }
+		timeline_dict[ starting_year ] = None
+		timeline_dict[ self.END_YEAR ] = None
+		timeline = list(timeline_dict.keys())
+		timeline.sort()
+
+		# timeline_dict = { 1000 BCE: None, 0 CE: Event-1, blah }
+		# timeline = [ 1000 BCE, 0 CE, ... ]
+		return [ ( timeline[i], timeline[i + 1], timeline_dict[ timeline[i] ] ) for i in range(len(timeline) - 1) ]
+
+	# The expected growth target for the whole timeline, epoch by epoch, without running anything. Each epoch picks up
+	#   from where the last one's target ended, the same way Population.apply would pick up from len(self).
+	#
+	# Returns [ (lower, upper, event, trajectory) ], where trajectory[t] is the target t years after lower. This raises
+	#   the same ValueError a bad curve fit would raise in the middle of history_preflight.
+	def trajectories(self, starting_year=-1000):
+		from soc import growth_trajectory
+
+		out = []
+		size, growth_rate, carry_cap, curve = 0, 0, -1, None
+		for lower, upper, ev in self.timeline(starting_year):
+			years = int(upper - lower)
+			if ev is not None:
+				if ev.population_change is not None:
+					ev.population_change.convert('raw')
+					size += ev.population_change.value
+				growth_rate = ev.params['Growth Rate'].convert('raw / year')
+				if 'Carry Capacity' in ev.params:
+					carry_cap = ev.params['Carry Capacity'].value
+				curve = ev.curve
+
+			trajectory = growth_trajectory(
+				years,
+				curve=curve,
+				growth_rate=growth_rate,
+				b=ev.population_change.value if curve == 'square root' and ev is not None else size,
+				carry_cap=carry_cap,
+				measured_time=getattr(ev.params['Growth Rate'], 'measured_time', None) if ev is not None else None
+			)
+
+			out.append( ( lower, upper, ev, trajectory ) )
+			size = trajectory[-1]
+
+		return out
+
+	# Expected population for the whole timeline in a fraction of a second, for previewing a config. See projection.py.
+	#   Returns (years, sizes, pyramids), with pyramids shaped (years x age ranges x 2), columns (female, male).
+	def project(self, starting_year=-1000):
+		from projection import Projection
+
+		projection = Projection()
+		years, states = projection.project(self, starting_year)
+		return years, projection.sizes(states), projection.pyramids(states)
+
+	# population_mode=PopulationType.COHORT only keeps head counts, which is a lot lighter for big islands
+	def history_preflight(self, starting_year=-1000, verbose=False, population_mode=PopulationType.HISTORICAL, keyframe_interval=None, sink=None): # 1000 BCE start by default
+		# Fail on anything that can't be fit before spending minutes on the run
+		self.trajectories(starting_year)
 
 		# This population is a concept I'm using to do the history run, where we're
 		#   assuming no one will ever immigrate or emigrate. When we go to do the
@@ -145,28 +271,30 @@ class Island(Process):
 		#   a mother from Upolu and impregnate her, and classify that baby as from
 		#   Upolu.  That way individuals can match the ones we create a record
 		#   for here, and we can track actual ethnic makeup of people separately.
-		history = History(Population(0), starting_year)
+		# A fresh history stream every time, so the same seed always gives the same history
+		from streams import generator, HISTORY
+		self.ids = IdAllocator(self.name)
+		rng = generator(self.seed, self.name, HISTORY, self.replicate)
+		history = History(Population(0, ids=self.ids, mode=population_mode, rng=rng), starting_year, sink=sink)
 		pop = history.pop 
 
-		timeline_dict = { actual_year(ev.year): ev for ev in self.major_events }
-		timeline_dict[ starting_year ] = None
-		timeline_dict[ self.END_YEAR ] = None
-		timeline = list(timeline_dict.keys())
-		timeline.sort()
-
-		# timeline_dict = { 1000 BCE: None, 0 CE: Event-1, blah }
-		# timeline = [ 1000 BCE, 0 CE, ... ]
-		for i in range(len(timeline) - 1):
-			lower = timeline[i]
-			upper = timeline[i + 1]
-			ev = timeline_dict[ timeline[i] ]
+		for lower, upper, ev in self.timeline(starting_year):
 			if verbose and ev is not None:
 				print(f'{ev} occurring {ev.year}')
 			if ev is not None:
-				pop.apply(ev)
+				pop.apply(ev, years=int(upper - lower))
 				if ev.population_change is not None:
-					history.initial_births()
+					history.initial_births(pop.arrivals)
 			history.run( int(upper - lower), verbose=verbose )
 
+		history.record.close()
+		if keyframe_interval is not None and sink is None:
+			history.build_keyframes(keyframe_interval)
 		self.history = history
-		
+
+	# GENERATE straight to histories/{name}.csv without ever holding the whole record, for when there isn't the memory
+	#   to history_preflight and then export_vital_record. Import it afterwards to do anything else with it.
+	def stream_vital_record(self, starting_year=-1000, verbose=False, population_mode=PopulationType.HISTORICAL, uuids=False):
+		from record import RecordWriter
+		sink = RecordWriter(self.csv_path(uuids), uuid=IdAllocator(self.name).uuid if uuids else None)
+		self.history_preflight(starting_year, verbose=verbose, population_mode=population_mode, sink=sink)
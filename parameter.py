@@ -1,5 +1,5 @@
 from enum import Enum
-import random
+import numpy as np
 import scipy.stats as stats
 
 class Parameter:
@@ -22,9 +22,11 @@ class Parameter:
 		}
 	}
 
-	def __init__(self, type_, value, unit, follow=None, distribution=None, verbose=False):
+	# rng is a numpy Generator to roll with, see streams.py
+	def __init__(self, type_, value, unit, follow=None, distribution=None, verbose=False, rng=None):
 		self.type_ = type_
 		self.unit = unit
+		self.rng = rng if rng is not None else np.random.default_rng()
 
 		if verbose:
 			print(f'\t\tType: {self.type_}')
@@ -50,8 +52,8 @@ class Parameter:
 			assert distribution == None
 			min_, max_, time = value
 			# Assume time is in years ago and convert min_ and max_ raw
-			min_ = self.CONVERSION_TABLE['raw']['log(Ne)']( random.uniform(*min_) )
-			max_ = self.CONVERSION_TABLE['raw']['log(Ne)']( random.uniform(*max_) )
+			min_ = self.CONVERSION_TABLE['raw']['log(Ne)']( self.rng.uniform(*min_) )
+			max_ = self.CONVERSION_TABLE['raw']['log(Ne)']( self.rng.uniform(*max_) )
 			self.value = ( max_ - min_ ) / time
 			self.measured_time = time
 			self.unit = "raw / year"
@@ -59,7 +61,7 @@ class Parameter:
 			match distribution:
 				# Uniform by default, so...
 				case None:
-					self.value = random.uniform(*value)
+					self.value = self.rng.uniform(*value)
 				case { 'type_': 'normal' }:
 					mu = distribution['mu']
 					sigma = distribution['sigma']
@@ -71,7 +73,7 @@ class Parameter:
 						lower, upper = value
 						X = stats.truncnorm( (lower - mu) / sigma, (upper - mu) / sigma, **distro_params)
 
-					self.value = X.rvs()
+					self.value = X.rvs(random_state=self.rng)
 
 			
 
@@ -0,0 +1,134 @@
+# Deterministic projections of an island's population, straight from the demography table.
+#
+# Population.elapse_year is already an age-structured model: everyone gets a year older, the people aging into a new
+#   AgeRange survive at that range's survival rate (see AgeRange.__init__), and then just enough babies are born to hit the
+#   growth target. Take the expected value of all of that and it's linear in the single-year age/sex vector n:
+#
+#     with a curve:     n' = L n + target * s,   L = (I - s 1') S
+#     without a curve:  n' = L n + growth_rate * s,   L = S + s 1' (I - S)
+#
+#   where S ages everyone by a year with survival, and s splits newborns by sex into the age 0 cells. That second L is a
+#   Leslie matrix where fertility exactly replaces whoever died. The one nonlinearity is that births can't go negative, so
+#   a year where the target drops faster than people die is just n' = S n. Projecting the whole timeline is then a few
+#   thousand matrix-vector products instead of a full stochastic run.
+import numpy as np
+
+from soc import Population, growth_trajectory
+
+class Projection:
+	def __init__(self, ddt=Population.ddt):
+		self.brackets = [ ( low, int(high) ) for low, high in ddt.keys() ]
+		self.rates    = list(ddt.values())
+
+		# Single-year ages 0 .. oldest_min_age, where the last one is open ended like the oldest AgeRange
+		self.oldest = self.brackets[-1][0]
+		A = self.oldest + 1
+		self.A = A
+
+		# Index of a (age, sex) cell in n. Females first, like everywhere else (0 == female).
+		cell = lambda age, sex: sex * A + age
+
+		# S: aging and survival. People only die aging into a new bracket.
+		S = np.zeros((2 * A, 2 * A))
+		for i, ( ( low, high ), ( mr, fr ) ) in enumerate(zip(self.brackets, self.rates)):
+			for age in range(low, min(high, self.oldest) + 1):
+				if age == 0:
+					continue
+				if age == low:
+					prev_mr, prev_fr = self.rates[i - 1]
+					survival = ( fr / prev_fr, mr / prev_mr )
+				else:
+					survival = ( 1.0, 1.0 )
+				for sex in range(2):
+					S[ cell(age, sex), cell(age - 1, sex) ] = survival[sex]
+		for sex in range(2):
+			S[ cell(self.oldest, sex), cell(self.oldest, sex) ] = 1.0
+		self.S = S
+
+		# s: newborn sex split. AgeRange.births calls someone female when uniform(-mr, fr) < 0, so girls come with probability mr / (mr + fr).
+		mr, fr = self.rates[0]
+		s = np.zeros(2 * A)
+		s[ cell(0, 0) ] = mr / (mr + fr)
+		s[ cell(0, 1) ] = fr / (mr + fr)
+		self.s = s
+
+		ones = np.ones(2 * A)
+		I    = np.eye(2 * A)
+		# How many people are left after aging, as a row vector
+		self.survivors = ones @ S
+		self.L_curve = ( I - np.outer(s, ones) ) @ S
+		self.L_line  = S + np.outer(s, ones @ ( I - S ))
+
+		# Sums single-year cells into the ddt's age brackets, for pyramids
+		self.B = np.zeros((len(self.brackets), A))
+		for i, ( low, high ) in enumerate(self.brackets):
+			self.B[ i, low:min(high, self.oldest) + 1 ] = 1
+
+	# The expected age/sex vector of Population(size): each bracket gets its share, spread evenly over its ages.
+	def arrivals(self, size):
+		n = np.zeros(2 * self.A)
+		for ( low, high ), ( mr, fr ) in zip(self.brackets, self.rates):
+			if mr + fr == 0:
+				continue
+			portion = np.floor( size * (mr + fr) / 100 )
+			ages    = np.arange(low, min(high, self.oldest) + 1)
+			n[ ages ]          += portion * mr / (mr + fr) / len(ages)
+			n[ self.A + ages ] += portion * fr / (mr + fr) / len(ages)
+		return n
+
+	# (brackets x 2) head counts for a state vector, youngest first, columns (female, male)
+	def pyramid(self, n):
+		return np.stack( ( self.B @ n[:self.A], self.B @ n[self.A:] ), axis=1 )
+
+	# Projects island from starting_year to Island.END_YEAR, following the same timeline and event parameters
+	#   Island.history_preflight would. Returns (years, states), where states[i] is the expected age/sex vector at the end of
+	#   years[i]. Use sizes and pyramids below to summarize them.
+	def project(self, island, starting_year=-1000):
+		n = np.zeros(2 * self.A)
+		growth_rate, carry_cap = 0, -1
+		years, states = [], []
+		# Counts years the same way History does, whole years from starting_year
+		year = starting_year
+
+		for lower, upper, ev in island.timeline(starting_year):
+			span  = int(upper - lower)
+			curve = None
+			if ev is not None:
+				if ev.population_change is not None:
+					n += self.arrivals( ev.population_change.convert('raw') )
+				growth_rate = ev.params['Growth Rate'].convert('raw / year')
+				if 'Carry Capacity' in ev.params:
+					carry_cap = ev.params['Carry Capacity'].value
+				curve = ev.curve
+
+			if curve is None:
+				target = None
+			else:
+				target = growth_trajectory(
+					span,
+					curve=curve,
+					growth_rate=growth_rate,
+					b=ev.population_change.value if curve == 'square root' else n.sum(),
+					carry_cap=carry_cap,
+					measured_time=getattr(ev.params['Growth Rate'], 'measured_time', None)
+				)
+
+			for t in range(1, span + 1):
+				births = ( n.sum() + growth_rate if target is None else target[t] ) - self.survivors @ n
+				if births < 0:
+					n = self.S @ n
+				elif target is None:
+					n = self.L_line @ n + growth_rate * self.s
+				else:
+					n = self.L_curve @ n + target[t] * self.s
+				years.append(year)
+				states.append(n)
+				year += 1
+
+		return np.array(years), np.array(states)
+
+	def sizes(self, states):
+		return states.sum(axis=1)
+
+	def pyramids(self, states):
+		return np.stack( ( states[:, :self.A] @ self.B.T, states[:, self.A:] @ self.B.T ), axis=2 )
@@ -0,0 +1,613 @@
+# Columnar storage for vital records.
+#
+# A History used to keep { year: { person_id: [ Event... ] } }, which costs a dict, a list and an Event (with its own __dict__)
+#   for every single event. Here every year instead gets one typed array per column:
+#
+#     id      int64    person id
+#     type    int8     EventType value
+#     moment  float64  exact moment in seconds into the (julian) year, see Event
+#     sex     int8     0 == female, 1 == male, -1 when it doesn't apply (anything but a BIRTH)
+#
+# The year itself is the key the columns are grouped under. record[year][person_id] still hands back a list of Events for
+#   code that wants them, but those are only built when asked for.
+from array import array
+from collections.abc import Mapping
+import numpy as np
+
+NO_SEX = -1
+# BIRTH, DEATH, PREG. See history.EventType.
+EVENT_TYPES = 3
+
+# Running event counts per year and event type. Dense over every year seen so far, so a single year is a lookup and a
+#   whole range of years is a slice.
+class YearTallies:
+	def __init__(self):
+		self.first_year = 0
+		self.counts = np.zeros((0, EVENT_TYPES), dtype=np.int64)
+
+	@property
+	def years(self):
+		return np.arange(self.first_year, self.first_year + len(self.counts))
+
+	# Grows the table so every year from low to high has a row
+	def cover(self, low, high):
+		if len(self.counts) == 0:
+			self.first_year = low
+			self.counts = np.zeros((high - low + 1, EVENT_TYPES), dtype=np.int64)
+			return
+
+		last_year = self.first_year + len(self.counts) - 1
+		if low >= self.first_year and high <= last_year:
+			return
+
+		first = min(low, self.first_year)
+		last  = max(high, last_year)
+		counts = np.zeros((last - first + 1, EVENT_TYPES), dtype=np.int64)
+		counts[ self.first_year - first : self.first_year - first + len(self.counts) ] = self.counts
+		self.first_year, self.counts = first, counts
+
+	def add(self, year, type_, count=1):
+		self.cover(year, year)
+		self.counts[year - self.first_year, type_] += count
+
+	# types is every row's event type for one year
+	def add_year(self, year, types):
+		self.cover(year, year)
+		self.counts[year - self.first_year] += np.bincount(np.asarray(types, dtype=np.int64), minlength=EVENT_TYPES)
+
+	# Parallel year and type columns, e.g. from VitalRecord.frame
+	def add_columns(self, years, types):
+		if len(years) == 0:
+			return
+		self.cover(int(years.min()), int(years.max()))
+		np.add.at(self.counts, ( years - self.first_year, types.astype(np.int64) ), 1)
+
+	def __call__(self, year, type_):
+		row = year - self.first_year
+		return int(self.counts[row, type_]) if 0 <= row < len(self.counts) else 0
+
+	# How many events of this type happened every year, lined up with self.years
+	def column(self, type_):
+		return self.counts[:, type_]
+
+# Where each person's BIRTH, DEATH and PREG rows live in the record: the year they're filed under and the row within it.
+#   Ids come off an IdAllocator so they're small dense integers, which lets this be plain arrays indexed by id. A single
+#   lookup is constant time and an array of ids is one fancy index. Rows of -1 mean there's no such event on record.
+#
+# If someone has two events of one type (which shouldn't happen) the one added last wins.
+class PersonIndex:
+	MISSING = -1
+
+	def __init__(self, capacity=1024):
+		self.years = np.zeros((capacity, EVENT_TYPES), dtype=np.int64)
+		self.rows  = np.full((capacity, EVENT_TYPES), self.MISSING, dtype=np.int64)
+
+	def __len__(self):
+		return int( np.count_nonzero( ( self.rows != self.MISSING ).any(axis=1) ) )
+
+	def __contains__(self, pid):
+		return 0 <= pid < len(self.rows) and bool( ( self.rows[pid] != self.MISSING ).any() )
+
+	# Makes room for ids up to and including top
+	def reserve(self, top):
+		capacity = len(self.rows)
+		if top < capacity:
+			return
+		while capacity <= top:
+			capacity *= 2
+		years = np.zeros((capacity, EVENT_TYPES), dtype=np.int64)
+		rows  = np.full((capacity, EVENT_TYPES), self.MISSING, dtype=np.int64)
+		years[:len(self.years)], rows[:len(self.rows)] = self.years, self.rows
+		self.years, self.rows = years, rows
+
+	# Parallel columns, years can be one year for all of them
+	def add(self, years, pids, types, rows):
+		pids = np.asarray(pids, dtype=np.int64)
+		if len(pids) == 0:
+			return
+		self.reserve( int(pids.max()) )
+		# Mapped from a file or shared memory, see MappedRecord.from_arrays
+		if not self.rows.flags.writeable:
+			self.years, self.rows = np.array(self.years), np.array(self.rows)
+		types = np.asarray(types, dtype=np.int64)
+		self.years[pids, types] = years
+		self.rows[pids, types]  = rows
+
+	# (year, row) of one person's event, or None
+	def position(self, pid, type_):
+		if not 0 <= pid < len(self.rows) or self.rows[pid, type_] == self.MISSING:
+			return None
+		return int(self.years[pid, type_]), int(self.rows[pid, type_])
+
+	# (years, rows) for an array of ids. rows is MISSING (and years meaningless) wherever there's no such event.
+	def lookup(self, pids, type_):
+		pids  = np.asarray(pids, dtype=np.int64)
+		known = ( pids >= 0 ) & ( pids < len(self.rows) )
+		where = np.where(known, pids, 0)
+		rows  = np.where( known, self.rows[where, type_], self.MISSING )
+		return self.years[where, type_], rows
+
+	# Every id with an event of this type
+	def ids(self, type_):
+		return np.flatnonzero( self.rows[:, type_] != self.MISSING )
+
+class YearColumns:
+	TYPECODES = { 'id': 'q', 'type': 'b', 'moment': 'd', 'sex': 'b' }
+	DTYPES    = { 'id': np.int64, 'type': np.int8, 'moment': np.float64, 'sex': np.int8 }
+
+	def __init__(self):
+		for column, typecode in self.TYPECODES.items():
+			setattr(self, column, array(typecode))
+
+	def __len__(self):
+		return len(self.id)
+
+	def append(self, pid, type_, moment, sex):
+		self.id.append(pid)
+		self.type.append(type_)
+		self.moment.append(moment)
+		self.sex.append(sex)
+
+	# Takes numpy arrays (or anything numpy can turn into one) and copies them in as raw bytes
+	def extend(self, pids, types, moments, sexes):
+		for column, values in zip(['id', 'type', 'moment', 'sex'], [pids, types, moments, sexes]):
+			getattr(self, column).frombytes( np.ascontiguousarray(values, dtype=self.DTYPES[column]).tobytes() )
+
+	# numpy views straight onto the arrays' buffers. Don't hold on to them across appends.
+	def arrays(self):
+		return { column: np.frombuffer(getattr(self, column), dtype=dtype) for column, dtype in self.DTYPES.items() }
+
+# What record[year] hands back: a read-only { person_id: [ Event... ] } over one year's columns
+class YearView(Mapping):
+	def __init__(self, year, columns):
+		self.year = year
+		self.columns = columns
+		self._rows = None
+
+	# person_id -> row numbers, in the order people first show up this year
+	@property
+	def rows(self):
+		if self._rows is None:
+			self._rows = {}
+			for row, pid in enumerate(self.columns.id):
+				self._rows.setdefault(pid, []).append(row)
+		return self._rows
+
+	def __getitem__(self, pid):
+		return [ self.event(row) for row in self.rows[pid] ]
+
+	def __iter__(self):
+		return iter(self.rows)
+
+	def __len__(self):
+		return len(self.rows)
+
+	def __contains__(self, pid):
+		return pid in self.rows
+
+	def event(self, row):
+		from history import Event, EventType
+
+		type_ = EventType( int(self.columns.type[row]) )
+		sex   = int(self.columns.sex[row])
+		return Event(type_, int(self.columns.id[row]), self.year, exact_moment=float(self.columns.moment[row]), sex=None if sex == NO_SEX else sex)
+
+#
+# tallies keeps per-year counts by event type as events come in, and people keeps a PersonIndex of where everyone's
+#   events are. Bulk loaders can turn that bookkeeping off with tally=False and call rebuild_tallies once they're done instead.
+class VitalRecord(Mapping):
+	def __init__(self, tally=True):
+		self.years   = {}
+		self.tally   = tally
+		self.tallies = YearTallies()
+		self.people  = PersonIndex()
+
+	def __getitem__(self, year):
+		return YearView(year, self.years[year])
+
+	def __iter__(self):
+		return iter(self.years)
+
+	def __len__(self):
+		return len(self.years)
+
+	def __contains__(self, year):
+		return year in self.years
+
+	def append(self, year, pid, type_, moment, sex=NO_SEX):
+		try:
+			columns = self.years[year]
+		except KeyError:
+			columns = self.years[year] = YearColumns()
+		columns.append(pid, type_, moment, NO_SEX if sex is None else sex)
+		if self.tally:
+			self.tallies.add(year, type_)
+			self.people.add(year, [pid], [type_], len(columns) - 1)
+
+	# Bulk version of append for a single year
+	def extend(self, year, pids, types, moments, sexes):
+		try:
+			columns = self.years[year]
+		except KeyError:
+			columns = self.years[year] = YearColumns()
+		first = len(columns)
+		columns.extend(pids, types, moments, sexes)
+		if self.tally:
+			self.tallies.add_year(year, types)
+			self.people.add(year, pids, types, np.arange(first, len(columns)))
+
+	# Nothing to flush, this is just so a VitalRecord can stand in as a History's sink like the ones below
+	def close(self):
+		pass
+
+	def rebuild_tallies(self):
+		frame = self.frame()
+		self.tallies = YearTallies()
+		self.tallies.add_columns(frame['year'], frame['type'])
+		self.people = PersonIndex()
+		self.people.add(frame['year'], frame['id'], frame['type'], frame['row'])
+		self.tally = True
+
+	# { column: numpy array } for one year, or empty columns if nothing happened that year
+	def columns(self, year):
+		try:
+			return self.years[year].arrays()
+		except KeyError:
+			return YearColumns().arrays()
+
+	# One person's event of the given type as an Event, or None
+	def event(self, pid, type_):
+		position = self.people.position(pid, type_)
+		if position is None:
+			return None
+		year, row = position
+		return self[year].event(row)
+
+	# Everything on record for one person, in BIRTH, DEATH, PREG order
+	def events_of(self, pid):
+		return [ event for event in ( self.event(pid, type_) for type_ in range(EVENT_TYPES) ) if event is not None ]
+
+	# Year of death minus year of birth for each id, NaN for anyone missing either
+	def ages_at_death(self, pids):
+		from history import EventType
+
+		birth_years, births = self.people.lookup(pids, EventType.BIRTH.value)
+		death_years, deaths = self.people.lookup(pids, EventType.DEATH.value)
+		known = ( births != PersonIndex.MISSING ) & ( deaths != PersonIndex.MISSING )
+		return np.where( known, death_years - birth_years, np.nan )
+
+	@property
+	def event_count(self):
+		return sum( map( len, self.years.values() ) )
+
+	# Everything as flat numpy columns sorted by year, with 'year' and 'row' (position within the year) columns added.
+	#   Within a year rows keep the order they were recorded in.
+	def frame(self):
+		years = sorted(self.years)
+		frame = { column: np.concatenate( [ self.years[year].arrays()[column] for year in years ] or [ np.empty(0, dtype=dtype) ] ) for column, dtype in YearColumns.DTYPES.items() }
+		lengths = [ len(self.years[year]) for year in years ]
+		frame['year'] = np.repeat( np.array(years, dtype=np.int64), lengths )
+		frame['row']  = np.arange( len(frame['year']), dtype=np.int64 ) - np.repeat( np.cumsum([0] + lengths)[:-1].astype(np.int64), lengths )
+		return frame
+
+# One year of a MappedRecord: the same columns as YearColumns, but read-only slices of the memory-mapped files
+class MappedYear:
+	def __init__(self, columns, start, stop):
+		for column in YearColumns.DTYPES:
+			setattr(self, column, columns[column][start:stop])
+
+	def __len__(self):
+		return len(self.id)
+
+	def arrays(self):
+		return { column: getattr(self, column) for column in YearColumns.DTYPES }
+
+	# A writable copy, for when something gets recorded into a year that's already on disk
+	def thaw(self):
+		columns = YearColumns()
+		columns.extend(self.id, self.type, self.moment, self.sex)
+		return columns
+
+# The binary format, a directory holding one .npy per column with every year's rows back to back, sorted by year:
+#
+#     id.npy, type.npy, moment.npy, sex.npy   the columns, with the dtypes in YearColumns.DTYPES
+#     years.npy                               (year, first row, row count) for every year
+#     tallies.npy                             YearTallies.counts with the year prepended to each row
+#     people_years.npy, people_rows.npy       the PersonIndex
+#
+# MappedRecord.load maps the columns rather than reading them, so opening a record costs next to nothing and years are only
+#   paged in once they're looked at. It's a VitalRecord otherwise, anything recorded into it afterwards lives in memory.
+class MappedRecord(VitalRecord):
+	# { name: array } of everything in the format, for saving or for copying somewhere else (see share_record)
+	@staticmethod
+	def arrays(record):
+		frame  = record.frame()
+		arrays = { column: frame[column] for column in YearColumns.DTYPES }
+
+		years   = np.array( sorted(record.years), dtype=np.int64 )
+		lengths = np.array( [ len(record.years[year]) for year in years.tolist() ], dtype=np.int64 )
+		arrays['years'] = np.stack([ years, np.cumsum(lengths) - lengths, lengths ], axis=1).reshape(-1, 3)
+
+		if not record.tally:
+			record.rebuild_tallies()
+		arrays['tallies'] = np.column_stack([ record.tallies.years, record.tallies.counts ])
+		arrays['people_years'] = record.people.years
+		arrays['people_rows']  = record.people.rows
+		return arrays
+
+	@staticmethod
+	def save(record, path):
+		import os
+		os.makedirs(path, exist_ok=True)
+		for name, values in MappedRecord.arrays(record).items():
+			np.save( os.path.join(path, f'{name}.npy'), values )
+
+	# years is an optional (first, last) window, inclusive, to only take those years. The tallies and person index then
+	#   get rebuilt from just the window, so loading costs however many rows are in it rather than the whole record.
+	@classmethod
+	def load(cls, path, years=None):
+		import os
+		names = [ *YearColumns.DTYPES, 'years', 'tallies', 'people_years', 'people_rows' ]
+		return cls.from_arrays( { name: np.load( os.path.join(path, f'{name}.npy'), mmap_mode='r' ) for name in names }, years=years )
+
+	# A record over arrays laid out like MappedRecord.arrays gives them, without copying the columns
+	@classmethod
+	def from_arrays(cls, arrays, years=None):
+		record = cls()
+		table  = np.asarray( arrays['years'] )
+		if years is not None:
+			table = table[ slice( *np.searchsorted( table[:, 0], [ years[0], years[1] + 1 ] ) ) ]
+		for year, start, length in table.tolist():
+			record.years[year] = MappedYear(arrays, start, start + length)
+
+		if years is not None:
+			record.rebuild_tallies()
+			return record
+
+		tallies = arrays['tallies']
+		if len(tallies) > 0:
+			record.tallies.first_year = int(tallies[0, 0])
+			record.tallies.counts = np.ascontiguousarray(tallies[:, 1:])
+		# Read-only, PersonIndex.add copies them before writing
+		record.people.years = arrays['people_years']
+		record.people.rows  = arrays['people_rows']
+		return record
+
+	def append(self, year, pid, type_, moment, sex=NO_SEX):
+		self.thaw(year)
+		super().append(year, pid, type_, moment, sex)
+
+	def extend(self, year, pids, types, moments, sexes):
+		self.thaw(year)
+		super().extend(year, pids, types, moments, sexes)
+
+	def thaw(self, year):
+		if isinstance( self.years.get(year), MappedYear ):
+			self.years[year] = self.years[year].thaw()
+
+# Handing a finished record to another process without pickling it: share_record copies MappedRecord.arrays into one
+#   block of shared memory and gives back a small descriptor (the block's name and where each array sits in it) that's
+#   cheap to send through a Pipe. attach_record on the other end maps the block and wraps it in a MappedRecord, no copy.
+#
+# The block outlives the process that made it. Whoever attaches owns it from then on and should unlink it when done
+#   (Shell.release does); failing that it goes when the attaching process exits.
+def share_record(record):
+	from multiprocessing import shared_memory
+
+	columns = { name: np.ascontiguousarray(values) for name, values in MappedRecord.arrays(record).items() }
+	layout, size = {}, 0
+	for name, values in columns.items():
+		layout[name] = ( size, values.dtype.str, values.shape )
+		size += -( -values.nbytes // 8 ) * 8 # keep every array 8 byte aligned
+
+	block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+	for name, values in columns.items():
+		offset, dtype, shape = layout[name]
+		block.buf[ offset : offset + values.nbytes ] = values.tobytes()
+	block.close()
+	untrack(block)
+	return { 'name': block.name, 'arrays': layout }
+
+# Stops this process's resource tracker from unlinking a block when the process exits, so it can be handed to another
+#   one. Needed because Python 3.11's SharedMemory has no track=False, and the tracker only knows the block by the
+#   private _name (with the leading slash).
+def untrack(block):
+	from multiprocessing import resource_tracker
+	resource_tracker.unregister(block._name, 'shared_memory')
+
+# (record, block) for a descriptor from share_record. Keep the block around as long as the record is in use.
+def attach_record(descriptor):
+	from multiprocessing import shared_memory
+
+	block  = shared_memory.SharedMemory(name=descriptor['name'])
+	arrays = {}
+	for name, ( offset, dtype, shape ) in descriptor['arrays'].items():
+		arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf, offset=offset)
+		arrays[name].flags.writeable = False
+	return MappedRecord.from_arrays(arrays), block
+
+# Sinks a History can stream its events into instead of keeping a VitalRecord. Anything with the same extend (and
+#   ideally close) works; a VitalRecord is itself the in-memory collector. Both of these only hold the running tallies,
+#   so a run's memory is the living population plus whatever one year adds.
+
+# Keeps the per-year counts and nothing else
+class RecordCounter:
+	def __init__(self):
+		self.tallies = YearTallies()
+		self.seen = set()
+		self.event_count = 0
+
+	def __len__(self):
+		return len(self.seen)
+
+	def extend(self, year, pids, types, moments, sexes):
+		self.seen.add(year)
+		self.tallies.add_year(year, types)
+		self.event_count += len(pids)
+
+	def close(self):
+		pass
+
+# Writes rows straight to a csv in the format Island.export_vital_record always has, so import_vital_record reads it
+#   back the same. Rows come out in the order they're recorded rather than grouped by year, which the importer
+#   doesn't mind. Pass uuid (e.g. IdAllocator.uuid) to write UUIDs instead of integer ids.
+#
+# If every year's rows do come out together and in order (like when exporting a whole VitalRecord) the writer also saves
+#   a year index next to the csv, {path}.index.npy, of (year, first byte, byte count). read_csv_window uses it to only
+#   read a range of years.
+class RecordWriter(RecordCounter):
+	HEADER = ['year', 'person_id', 'type', 'exact_moment', 'sex (if applicable)']
+
+	def __init__(self, path, uuid=None):
+		import csv
+		from history import EventType
+
+		super().__init__()
+		self.path   = path
+		self.file   = open(path, 'w', newline='')
+		self.writer = csv.writer(self.file)
+		self.uuid   = uuid
+		self.type_names = { type_.value: f'{type_.name}-{type_.value}' for type_ in EventType }
+		self.writer.writerow(self.HEADER)
+		self.index  = []
+		self.sorted = True
+
+	def extend(self, year, pids, types, moments, sexes):
+		if not self.index or self.index[-1][0] != year:
+			self.sorted = self.sorted and ( not self.index or self.index[-1][0] < year )
+			self.file.flush()
+			self.index.append( (year, self.file.tell()) )
+		super().extend(year, pids, types, moments, sexes)
+		pids = np.asarray(pids).tolist()
+		if self.uuid is not None:
+			pids = list(map(self.uuid, pids))
+		self.writer.writerows( [ year, pid, self.type_names[type_], moment, '' if sex == NO_SEX else sex ]
+				for pid, type_, moment, sex in zip(pids, np.asarray(types).tolist(), np.asarray(moments).tolist(), np.asarray(sexes).tolist()) )
+
+	def close(self):
+		import os
+		self.file.flush()
+		end = self.file.tell()
+		self.file.close()
+
+		index = f'{self.path}.index.npy'
+		if self.sorted:
+			starts = np.array( [ start for _, start in self.index ] + [end], dtype=np.int64 )
+			np.save( index, np.stack([ np.array( [ year for year, _ in self.index ], dtype=np.int64 ), starts[:-1], np.diff(starts) ], axis=1).reshape(-1, 3) )
+		elif os.path.exists(index):
+			os.remove(index)
+
+# Reading csvs back in bulk. Rather than a csv row (and Event) at a time, big blocks of text get a couple of string
+#   replaces so every field is a number, then go through numpy's loadtxt straight into the typed columns. That leans on
+#   the csvs being the ones RecordWriter writes: integer ids, no quoting, types like BIRTH-0.
+CSV_CHUNK = 1 << 24 # bytes of text parsed at a time
+CSV_DTYPE = np.dtype([ ('year', np.int64), ('id', np.int64), ('type', np.int8), ('moment', np.float64), ('sex', np.int8) ])
+
+# { column: numpy array } plus 'year' for a block of whole lines
+def parse_csv_rows(text):
+	import io
+	from history import EventType
+
+	text = text.replace('\r', '')
+	if not text.endswith('\n'):
+		text += '\n'
+	for type_ in EventType:
+		text = text.replace(f',{type_.name}-{type_.value},', f',{type_.value},')
+	# Blank sex is the last field on the line
+	text = text.replace(',\n', f',{NO_SEX}\n')
+
+	rows = np.loadtxt( io.StringIO(text), delimiter=',', dtype=CSV_DTYPE, ndmin=1 )
+	return { column: np.ascontiguousarray(rows[column]) for column in CSV_DTYPE.names }
+
+# Files parsed columns under their years in record, a VitalRecord
+def extend_by_year(record, frame):
+	order  = np.argsort( frame['year'], kind='stable' )
+	years, starts = np.unique( frame['year'][order], return_index=True )
+	bounds = np.append( starts, len(order) )
+	for year, start, stop in zip(years.tolist(), bounds[:-1].tolist(), bounds[1:].tolist()):
+		rows = order[start:stop]
+		record.extend( year, frame['id'][rows], frame['type'][rows], frame['moment'][rows], frame['sex'][rows] )
+
+# A VitalRecord from a csv written by RecordWriter, read CSV_CHUNK at a time. Nothing gets made into an Event until
+#   someone asks for one. years is an optional (first, last) window, inclusive. With the csv's year index only the bytes
+#   it points at get read. Streamed csvs (see Island.stream_vital_record) don't have one, so those get read in full and
+#   filtered down to the window instead.
+def read_csv(path, years=None):
+	import os
+	indexed = years is not None and os.path.exists(f'{path}.index.npy')
+	out = VitalRecord(tally=False)
+	with open(path, 'rb') as f:
+		if not indexed:
+			f.readline()
+			remaining = None
+		else:
+			index = np.load(f'{path}.index.npy')
+			index = index[ slice( *np.searchsorted( index[:, 0], [ years[0], years[1] + 1 ] ) ) ]
+			remaining = int( index[-1, 1] + index[-1, 2] - index[0, 1] ) if len(index) > 0 else 0
+			if remaining > 0:
+				f.seek( int(index[0, 1]) )
+
+		while remaining is None or remaining > 0:
+			lines = f.readlines( CSV_CHUNK if remaining is None else min(CSV_CHUNK, remaining) )
+			if not lines:
+				break
+			text = b''.join(lines)
+			if remaining is not None:
+				text = text[:remaining]
+				remaining -= len(text)
+			try:
+				frame = parse_csv_rows( text.decode() )
+			except ValueError as e:
+				raise ValueError(f'{path} is not a vital record csv import can read (UUID person ids?): {e}') from e
+			if years is not None and not indexed:
+				keep  = ( frame['year'] >= years[0] ) & ( frame['year'] <= years[1] )
+				frame = { column: values[keep] for column, values in frame.items() }
+			extend_by_year(out, frame)
+
+	out.rebuild_tallies()
+	return out
+
+# Compressed archives, for keeping lots of histories around. A directory with the record cut into chunks of `span` years
+#   (a century by default), each its own compressed .npz of year-sorted columns, plus index.npy of (first year, last
+#   year, rows) for every chunk. Reading a window of years only decompresses the chunks that overlap it, several at a
+#   time since zlib lets go of the GIL.
+def save_archive(record, path, span=100):
+	import os, glob
+	os.makedirs(path, exist_ok=True)
+	for stale in glob.glob( os.path.join(path, 'chunk-*.npz') ):
+		os.remove(stale)
+
+	frame  = record.frame()
+	chunks = np.floor_divide( frame['year'], span )
+	index  = []
+	for chunk in np.unique(chunks).tolist():
+		rows  = slice( *np.searchsorted( chunks, [chunk, chunk + 1] ) )
+		first = chunk * span
+		np.savez_compressed( os.path.join(path, f'chunk-{first}.npz'), **{ column: frame[column][rows] for column in ['year', *YearColumns.DTYPES] } )
+		index.append( (first, first + span - 1, rows.stop - rows.start) )
+	np.save( os.path.join(path, 'index.npy'), np.array(index, dtype=np.int64).reshape(-1, 3) )
+
+def read_archive_chunk(path, first):
+	import os
+	with np.load( os.path.join(path, f'chunk-{first}.npz') ) as data:
+		return { column: data[column] for column in data.files }
+
+# A VitalRecord from an archive. years is an optional (first, last) window, inclusive.
+def load_archive(path, years=None, workers=None):
+	import os
+	from concurrent.futures import ThreadPoolExecutor
+
+	index = np.load( os.path.join(path, 'index.npy') )
+	if years is not None:
+		index = index[ ( index[:, 1] >= years[0] ) & ( index[:, 0] <= years[1] ) ]
+
+	out = VitalRecord(tally=False)
+	with ThreadPoolExecutor(workers) as pool:
+		for frame in pool.map( lambda first: read_archive_chunk(path, first), index[:, 0].tolist() ):
+			if years is not None:
+				keep  = ( frame['year'] >= years[0] ) & ( frame['year'] <= years[1] )
+				frame = { column: values[keep] for column, values in frame.items() }
+			extend_by_year(out, frame)
+
+	out.rebuild_tallies()
+	return out
@@ -2,14 +2,37 @@ class Shell:
 	def __init__(self, simulator, server_receiver):
 		self.sim = simulator
 		self.rcv = server_receiver
+		# island name -> the vital record it sent over, mapped straight out of shared memory
+		self.records = {}
+		self.blocks  = {}
 
 	def run(self):
 		x = 0
 		while True:
-			print(self.rcv.recv())
+			message = self.rcv.recv()
+			if isinstance(message, dict):
+				self.attach(message)
+				message = message['message']
+			print(message)
 			x += 1
-			if x == 2:
+			if x == len(self.sim.island_registry):
 				break
 
 		print('done')
-				
+
+	def attach(self, message):
+		from record import attach_record
+		self.records[message['island']], self.blocks[message['island']] = attach_record(message['record'])
+
+	# Releases the records on the way out
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.release()
+
+	# Frees the shared memory behind every record. Don't use them after this.
+	def release(self):
+		for block in self.blocks.values():
+			block.unlink()
+		self.records, self.blocks = {}, {}
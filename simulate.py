@@ -1,11 +1,30 @@
+# One replicate of an ensemble, run in a worker process: a fresh Simulation, rerolled, with every island's history run
+#   into a RecordCounter so nothing but the tallies is kept. Sends back { island name: (first year, sizes) }.
+def ensemble_replicate(replicate, seed=None, starting_year=-1000, population_mode=None):
+	import numpy as np
+	from record import RecordCounter
+
+	simulation = Simulation(seed=seed, replicate=replicate)
+	simulation.reroll()
+	summaries = {}
+	for island in simulation.islands:
+		kwargs = {} if population_mode is None else { 'population_mode': population_mode }
+		island.history_preflight(starting_year, sink=RecordCounter(), **kwargs)
+		summaries[island.name] = ( island.history.starting_year, np.array(island.history.sizes, dtype=np.int64) )
+	return summaries
+
 class Simulation:
-	def __init__(self, verbose=False):
+	# seed is the master seed every island's random streams come from, see streams.py. With one, everything including
+	#   GENERATE is reproducible and histories get reused from the cache (see cache.py) whenever the parameters haven't
+	#   changed. Without one every run is fresh and the cache isn't touched.
+	def __init__(self, verbose=False, seed=None, replicate=0):
 		from island import Island
 		import yaml
 
 		with open("config.yaml", "r") as stream:
-			self.island_registry = { island.name: island for island in [ Island(**doc, verbose=verbose) for doc in yaml.safe_load_all(stream) ] }
+			self.island_registry = { island.name: island for island in [ Island(**doc, verbose=verbose, seed=seed, replicate=replicate) for doc in yaml.safe_load_all(stream) ] }
 
+		self.seed = seed
 		self.resolve_event_dependencies(verbose=verbose)
 		self.inject_multiprocessing_config()
 
@@ -25,6 +44,11 @@ class Simulation:
 
 		print('bingo bango bongo')
 
+	# The islands' records stay mapped in self.shell.records after run returns, for queries and playback. This frees the
+	#   shared memory behind them once you're done; failing that it goes when the process exits.
+	def close(self):
+		self.shell.release()
+
 	def inject_multiprocessing_config(self):
 		from multiprocessing import Pipe
 		from shell import Shell
@@ -46,8 +70,70 @@ class Simulation:
 			print(f'{island}')
 			for event in island.events.values():
 				print(f'\t{event.name}: {event.params}')
+			for lower, upper, event, trajectory in island.trajectories():
+				print(f'\t{lower:.0f} - {upper:.0f} ({event}): {trajectory[0]:.0f} -> {trajectory[-1]:.0f} people')
+
+	# Every island's expected population over its whole timeline, from the precomputed growth targets
+	def trajectory_plot(self, starting_year=-1000):
+		import matplotlib.pyplot as plt
+		import numpy as np
+
+		for island in self.islands:
+			years, sizes = [], []
+			for lower, upper, event, trajectory in island.trajectories(starting_year):
+				years.append( lower + np.arange(len(trajectory)) )
+				sizes.append( trajectory )
+			plt.plot( np.concatenate(years), np.concatenate(sizes), label=island.name )
+
+		plt.legend()
+		plt.show()
 				
 
+	# Deterministic preview of every island's population, e.g. right after a config change or a reroll
+	def preview(self, starting_year=-1000, plot=True):
+		import matplotlib.pyplot as plt
+
+		for island in self.islands:
+			years, sizes, pyramids = island.project(starting_year)
+			print(f'{island}: {sizes.max():.0f} people at most ({years[sizes.argmax()]}), {sizes[-1]:.0f} by {years[-1]}')
+			if plot:
+				plt.plot( years, sizes, label=island.name )
+
+		if plot:
+			plt.legend()
+			plt.show()
+
+	# Monte Carlo over the rerolled parameters: replicates independent reroll + history_preflight runs, spread over a
+	#   process pool (one worker per core unless told otherwise). Returns { island name: (years, sizes) } with sizes shaped
+	#   (replicates, years), the population at the end of each year. Replicates that ran a year short are NaN there.
+	# Replicate r runs on streams spawned from (seed, r), with seed defaulting to this Simulation's.
+	def ensemble(self, replicates, seed=None, workers=None, starting_year=-1000, population_mode=None):
+		import numpy as np
+		from concurrent.futures import ProcessPoolExecutor
+		from functools import partial
+
+		run = partial(ensemble_replicate, seed=self.seed if seed is None else seed, starting_year=starting_year, population_mode=population_mode)
+		with ProcessPoolExecutor(workers) as pool:
+			results = list( pool.map(run, range(replicates)) )
+
+		out = {}
+		for name in self.island_registry:
+			first = min( result[name][0] for result in results )
+			last  = max( result[name][0] + len(result[name][1]) for result in results )
+			sizes = np.full( (replicates, last - first), np.nan )
+			for i, result in enumerate(results):
+				start, values = result[name]
+				sizes[ i, start - first : start - first + len(values) ] = values
+			out[name] = ( np.arange(first, last), sizes )
+		return out
+
+	# Quantiles of an ensemble's population sizes per island and year, as { island name: (years, quantiles) } with
+	#   quantiles shaped (len(q), years)
+	@staticmethod
+	def ensemble_summary(ensemble, q=(0.05, 0.5, 0.95)):
+		import numpy as np
+		return { name: ( years, np.nanquantile(sizes, q, axis=0) ) for name, (years, sizes) in ensemble.items() }
+
 	def reroll(self):
 		for island in self.island_registry.values():
 			for event in island.events.values():
@@ -8,18 +8,42 @@ import uuid
 from enum import Enum
 import warnings
 
+# Hands out person ids. Every Population built for one island shares an allocator, so ids are plain
+#   monotonically increasing ints that are unique per island. UUIDs are derived from the island's
+#   namespace only when someone asks for one.
+class IdAllocator:
+	def __init__(self, namespace=None, start=0):
+		self.next_id   = start
+		self.namespace = uuid.uuid5(uuid.NAMESPACE_OID, namespace if namespace is not None else 'islands')
+
+	def __call__(self):
+		pid = self.next_id
+		self.next_id += 1
+		return pid
+
+	def allocate(self, count):
+		return numpy.arange(self.reserve(count), self.next_id, dtype=numpy.int64)
+
+	# Claims a block of count ids and returns the first one
+	def reserve(self, count):
+		first = self.next_id
+		self.next_id += count
+		return first
+
+	def uuid(self, pid):
+		return uuid.uuid5(self.namespace, str(pid))
+
 class Individual:
+	# No __dict__ and no back-reference to a population. There can be a lot of these.
+	__slots__ = ('age', 'sex', 'id', 'yob')
 	
 	# 0 == female, 1 == male
-	def __init__(self, age=0, sex=0, id=None, yob=None, pop=None):
+	def __init__(self, age=0, sex=0, id=None, yob=None):
 		self.age = age
 		self.sex = sex
-		self.id  = uuid.uuid4() if id is None else id
+		self.id  = id
 		self.yob = yob
 
-		# Relations
-		self.pop = pop
-
 	def __str__(self):
 		return f'{self.age} year old {"male" if self.sex == 1 else "female"}'
 
@@ -29,8 +53,11 @@ class Individual:
 	def is_female(self):
 		return self.sex == 0
 
-	def regen_id(self):
-		self.id = uuid.uuid4()
+	def regen_id(self, ids):
+		self.id = ids()
+
+	def uuid(self, ids):
+		return ids.uuid(self.id)
 
 	# Let's say that the islanders had an active interest in population control as part of their
 	#  relationship with the land. They did not want to over-populate, and to that end they attempted
@@ -43,26 +70,160 @@ class Individual:
 	def eval_maternity(self):
 		pass
 
+	# If this person lives in a SIMULATED Population, age them with Population.set_age instead so they
+	#   end up in the right AgeRange.
 	def set_age(self, age):
-		old_age = self.age
 		self.age = age
-		if self.pop is not None:
-			self.pop.validate_age_range(self, old_age)
 
 	def grow(self, by=1):
 		if self.is_female():
 			self.eval_maternity()
-		old_age = self.age
 		self.age += by
 
-		if self.pop is not None:
-			self.pop.validate_age_range(self, old_age)
+# Struct-of-arrays storage for everyone in one AgeRange while in HISTORICAL mode. A history run only ever
+#   needs ids, ages and sexes, so instead of an Individual per person we keep one contiguous array per field.
+#   Capacity doubles whenever it runs out, so appending a person is amortized O(1).
+#
+# tally is the owning AgeRange's (female, male) head count, which is kept up to date on every change.
+class PersonArrays:
+	def __init__(self, tally, capacity=16):
+		self.n = 0
+		self.tally = tally
+		self._ids   = numpy.empty(capacity, dtype=numpy.int64)
+		self._ages  = numpy.empty(capacity, dtype=numpy.int32)
+		self._sexes = numpy.empty(capacity, dtype=numpy.int8)
+
+	def __len__(self):
+		return self.n
+
+	@property
+	def ids(self):
+		return self._ids[:self.n]
+
+	@property
+	def ages(self):
+		return self._ages[:self.n]
+
+	@property
+	def sexes(self):
+		return self._sexes[:self.n]
+
+	def reserve(self, extra):
+		needed = self.n + extra
+		if needed <= len(self._ids):
+			return
+
+		capacity = max(needed, 2 * len(self._ids))
+		for field in ['_ids', '_ages', '_sexes']:
+			old = getattr(self, field)
+			new = numpy.empty(capacity, dtype=old.dtype)
+			new[:self.n] = old[:self.n]
+			setattr(self, field, new)
+
+	def append(self, id, age, sex):
+		self.reserve(1)
+		self._ids[self.n]   = id
+		self._ages[self.n]  = age
+		self._sexes[self.n] = sex
+		self.n += 1
+		self.tally[sex] += 1
+
+	def extend(self, ids, ages, sexes):
+		count = len(ids)
+		self.reserve(count)
+		self._ids[self.n:self.n + count]   = ids
+		self._ages[self.n:self.n + count]  = ages
+		self._sexes[self.n:self.n + count] = sexes
+		self.n += count
+		self.tally += numpy.bincount(sexes, minlength=2)
+
+	# Removes everyone selected by the boolean mask and hands back their (ids, ages, sexes)
+	def take(self, mask):
+		taken = ( self.ids[mask], self.ages[mask], self.sexes[mask] )
+		keep  = ~mask
+		count = int(numpy.count_nonzero(keep))
+		for field in ['_ids', '_ages', '_sexes']:
+			column = getattr(self, field)
+			column[:count] = column[:self.n][keep]
+		self.n = count
+		self.tally -= numpy.bincount(taken[2], minlength=2)
+		return taken
+
+# Storage for one AgeRange in COHORT mode: how many people of each single-year age and sex there are, and not much else.
+#
+# Ids still have to line up across the vital record, but everyone born (or arriving) together gets one contiguous block of
+#   ids from the IdAllocator. So each (age, sex) cell only keeps a short list of [first_id, count] runs. Nothing tells
+#   people in a cell apart in a counts model, so whenever some of them die we just hand out the newest ids in the cell.
+#   Memory goes with the number of age classes instead of the headcount.
+#
+# Like PersonArrays, tally is the owning AgeRange's running (female, male) head count.
+class Cohorts:
+	def __init__(self, width, tally):
+		self.counts = numpy.zeros((width, 2), dtype=numpy.int64)
+		self.runs   = [ ( [], [] ) for _ in range(width) ]
+		self.tally  = tally
+
+	def __len__(self):
+		return int(self.tally.sum())
+
+	def __contains__(self, pid):
+		return any( first <= pid < first + count for cell in self.runs for runs in cell for first, count in runs )
+
+	def add(self, offset, sex, runs):
+		self.runs[offset][sex].extend( [ first, count ] for first, count in runs if count > 0 )
+		added = sum( count for _, count in runs )
+		self.counts[offset, sex] += added
+		self.tally[sex] += added
+
+	# Removes count people from a cell and returns their ids
+	def remove(self, offset, sex, count):
+		self.counts[offset, sex] -= count
+		self.tally[sex] -= count
+		return take_newest(self.runs[offset][sex], count)
+
+	# Everyone gets a year older. Returns the runs and counts of the oldest cell, which just fell off the end.
+	def shift(self):
+		runs, counts = self.runs.pop(), self.counts[-1].copy()
+		self.runs.insert(0, ( [], [] ))
+		self.counts[1:] = self.counts[:-1]
+		self.counts[0]  = 0
+		self.tally -= counts
+		return runs, counts
+
+	# Flat (ids, ages, sexes) arrays for everyone in here, given the age of the first cell
+	def arrays(self, min_age):
+		ids, ages, sexes = [ numpy.empty(0, dtype=numpy.int64) ], [ numpy.empty(0, dtype=numpy.int32) ], [ numpy.empty(0, dtype=numpy.int8) ]
+		for offset, cell in enumerate(self.runs):
+			for sex, runs in enumerate(cell):
+				for first, count in runs:
+					ids.append( numpy.arange(first, first + count, dtype=numpy.int64) )
+					ages.append( numpy.full(count, min_age + offset, dtype=numpy.int32) )
+					sexes.append( numpy.full(count, sex, dtype=numpy.int8) )
+		return numpy.concatenate(ids), numpy.concatenate(ages), numpy.concatenate(sexes)
+
+# Pops count ids off the end of a list of [first_id, count] runs
+def take_newest(runs, count):
+	taken = [ numpy.empty(0, dtype=numpy.int64) ]
+	while count > 0:
+		first, n = runs[-1]
+		k = min(n, count)
+		taken.append( numpy.arange(first + n - k, first + n, dtype=numpy.int64) )
+		if k == n:
+			runs.pop()
+		else:
+			runs[-1][1] = n - k
+		count -= k
+	return numpy.concatenate(taken)
 
 class AgeRange:
 
 	# These defaults are for the 0-4 age range on the Mali 2017 demographic chart. The primary assumption here is that developing countries always look like this. 
-	def __init__(self, population, range=(0,4), proportion=(9.2, 8.9)):
+	#
+	# tally is where this range keeps its running (female, male) head count. Population hands out rows of its own tallies
+	#   so it can answer size questions without asking every range.
+	def __init__(self, population, range=(0,4), proportion=(9.2, 8.9), tally=None):
 		self.min_age, self.max_age = range
+		self.tally = tally if tally is not None else numpy.zeros(2, dtype=numpy.int64)
 
 		# Male rate and female rate in %
 		self.mr, self.fr = proportion
@@ -86,24 +247,36 @@ class AgeRange:
 		self.fdr = 0.0
 		self.mdr = 0.0		
 
+		# The oldest range has no one to age into, so in COHORT mode its only cell holds everyone at or past min_age
+		self.open = self.max_age == max( ceiling for _, ceiling in self.population.ddt.keys() )
+
 		# Population set for this age range
 		match self.mode:
 			case PopulationType.HISTORICAL:
 				self.set_historical_mode()
 			case PopulationType.SIMULATED:
 				self.set_simulated_mode()
+			case PopulationType.COHORT:
+				self.set_cohort_mode()
 
 	def __getitem__(self, key):
 		assert self.mode == PopulationType.SIMULATED
 		return self.P[key]
 
+	# Setting and deleting go through here so the population's id index always knows which AgeRange has whom
 	def __setitem__(self, key, newvalue):
 		assert self.mode == PopulationType.SIMULATED
+		if key in self.P:
+			del self[key]
 		self.P[key] = newvalue
+		self.population.index[key] = self
+		self.tally[ int(newvalue.is_male()) ] += 1
 
 	def __delitem__(self, key):
 		assert self.mode == PopulationType.SIMULATED
+		self.tally[ int(self.P[key].is_male()) ] -= 1
 		del self.P[key]
+		del self.population.index[key]
 
 	@property
 	def mode(self):
@@ -113,48 +286,109 @@ class AgeRange:
 	def people(self):
 		match self.mode:
 			case PopulationType.HISTORICAL:
-				return self.P
+				# Only built on request, e.g. by iteration. Nothing in the history run itself needs these.
+				return [ Individual(age=age, sex=sex, id=id) for id, age, sex in zip(self.P.ids.tolist(), self.P.ages.tolist(), self.P.sexes.tolist()) ]
 			case PopulationType.SIMULATED:
 				return list(self.P.values())
+			case PopulationType.COHORT:
+				return [ Individual(age=age, sex=sex, id=id) for id, age, sex in zip(*( column.tolist() for column in self.P.arrays(self.min_age) )) ]
+
+	def __len__(self):
+		return int(self.tally.sum())
 
 	def set_historical_mode(self):
-		self.P = []
-		self.dead_P = []
+		self.tally[:] = 0
+		self.P = PersonArrays(self.tally)
 
 	def set_simulated_mode(self):
+		self.tally[:] = 0
 		self.P = {}
 		self.dead_P = {}
 
+	def set_cohort_mode(self):
+		self.tally[:] = 0
+		self.P = Cohorts( 1 if self.open else int(self.max_age) - self.min_age + 1, self.tally )
+
+	# Index of the COHORT cell for someone this age
+	def cell(self, age):
+		return 0 if self.open else age - self.min_age
+
 	def new_individual(self, birth=True):
-		new_p = Individual( age = 0 if birth else random.randint( self.min_age, self.max_age ), sex = 0 if random.uniform( -1 * self.mr, self.fr ) < 0 else 1 ) 
-		self.P.append(new_p)
+		new_p = Individual( age = 0 if birth else int( self.population.rng.integers( self.min_age, int(self.max_age) + 1 ) ), sex = 0 if self.population.rng.uniform( -1 * self.mr, self.fr ) < 0 else 1, id = self.population.ids() ) 
+		self.append(new_p)
 		return new_p
 
+	# Same draws as new_individual, but for count people at once
+	def populate(self, count):
+		ages  = self.population.rng.integers( self.min_age, int(self.max_age) + 1, size=count )
+		sexes = numpy.where( self.population.rng.uniform( -1 * self.mr, self.fr, size=count ) < 0, 0, 1 )
+
+		match self.mode:
+			case PopulationType.HISTORICAL:
+				self.P.extend(self.population.ids.allocate(count), ages, sexes)
+			case PopulationType.COHORT:
+				cells = numpy.bincount( ( ages - self.min_age ) * 2 + sexes, minlength=2 * ( int(self.max_age) - self.min_age + 1 ) ).reshape(-1, 2)
+				for age, sex in zip(*numpy.nonzero(cells)):
+					count = int(cells[age, sex])
+					self.P.add( self.cell(self.min_age + age), sex, [ ( self.population.ids.reserve(count), count ) ] )
+
+	# count newborns in one go. All the girls get one block of ids and all the boys another (so in COHORT mode each is a
+	#   single run in the newborn cell). Returns parallel (ids, sexes) arrays.
+	def births(self, count):
+		female_count = int( numpy.count_nonzero( self.population.rng.uniform( -1 * self.mr, self.fr, size=count ) < 0 ) )
+		male_count   = count - female_count
+
+		first = self.population.ids.reserve(count)
+		ids   = numpy.arange(first, first + count, dtype=numpy.int64)
+		sexes = numpy.repeat( numpy.array([0, 1], dtype=numpy.int8), [ female_count, male_count ] )
+
+		match self.mode:
+			case PopulationType.HISTORICAL:
+				self.P.extend( ids, numpy.zeros(count, dtype=numpy.int32), sexes )
+			case PopulationType.COHORT:
+				self.P.add( 0, 0, [ ( first, female_count ) ] )
+				self.P.add( 0, 1, [ ( first + female_count, male_count ) ] )
+			case PopulationType.SIMULATED:
+				for id, sex in zip(ids.tolist(), sexes.tolist()):
+					self.append( Individual(age=0, sex=sex, id=id) )
+
+		return ids, sexes
+
 	def append(self, p):
 		if type(p) != Individual:
 			raise TypeError(f'{type(self)} can only append objects of type Individual')
 
 		match self.mode:
 			case PopulationType.HISTORICAL:
-				self.P.append(p)
+				self.P.append(p.id, p.age, p.sex)
 			case PopulationType.SIMULATED:
-				self.P[p.id] = p
+				self[p.id] = p
+			case PopulationType.COHORT:
+				self.P.add( self.cell(p.age), p.sex, [ ( p.id, 1 ) ] )
 
 	# Every year, an unknown amount of the population ages into the next age range, at which point we determine who survives entering the next
 	#   age range. It's a fun abstraction, but I'd like to improve on this.
 	#
 	# Instead I want to do something like a preview. I'll write about it more down in the Population class. 
-	def age_in(self, new_P, verbose=False):
-		females = [ p for p in new_P if p.is_female() ]
-		males   = list( set(new_P) - set(females) )
+	#
+	# In HISTORICAL mode the people aging in are given as (ids, ages, sexes) arrays, in COHORT mode as the (runs, counts) of a
+	#   cell that just aged out of the range below. Either way, this returns the ids of whoever died.
+	def age_in(self, *people, verbose=False):
+		match self.mode:
+			case PopulationType.HISTORICAL:
+				ids, ages, sexes = people
+				female_count = int(numpy.count_nonzero(sexes == 0))
+				male_count   = len(sexes) - female_count
+			case PopulationType.COHORT:
+				runs, ( female_count, male_count ) = people
 
 		if verbose:
-			print(f'{len(females)} females and {len(males)} males aging in')
+			print(f'{female_count} females and {male_count} males aging in')
 
-		immunity_idol_eqn = lambda p_set, survival_rate: math.modf( len(p_set) * survival_rate )
+		immunity_idol_eqn = lambda p_len, survival_rate: math.modf( p_len * survival_rate )
 
-		female_remainder, female_idols = immunity_idol_eqn(females, self.female_sr)
-		male_remainder,   male_idols   = immunity_idol_eqn(males,   self.male_sr  )
+		female_remainder, female_idols = immunity_idol_eqn(female_count, self.female_sr)
+		male_remainder,   male_idols   = immunity_idol_eqn(male_count,   self.male_sr  )
 
 		self.fdr += female_remainder
 		self.mdr += male_remainder
@@ -169,59 +403,68 @@ class AgeRange:
 
 		if verbose:
 			print(f'{female_idols} females and {male_idols} males survive')
-			death_count = 0
 
-		# From here on, I shouldn't have to differentiate between M/F for the code itself
-		for segregated_P in [ zip(females, self.idol_set( female_idols, len(females) ) ), zip(males, self.idol_set( male_idols, len(males) ) ) ]:
-			for tuple in segregated_P:
-				person = tuple[0]
-				if tuple[1] == 1:
-					self.append( person )
-				else:
-					self.dead_P.append( person )
+		match self.mode:
+			case PopulationType.HISTORICAL:
+				dead  = self.idol_set( sexes, female_count, ( female_idols, male_idols ) )
+				alive = numpy.ones(len(sexes), dtype=bool)
+				alive[dead] = False
 
-					if verbose:
-						print(f'{person} died')
-						death_count += 1
+				self.P.extend( ids[alive], ages[alive], sexes[alive] )
+				dead = ids[dead]
+			case PopulationType.COHORT:
+				dead = numpy.concatenate([ take_newest( runs[0], female_count - int(female_idols) ), take_newest( runs[1], male_count - int(male_idols) ) ])
+				self.P.add( self.cell(self.min_age), 0, runs[0] )
+				self.P.add( self.cell(self.min_age), 1, runs[1] )
 
 		if verbose:
-			print(f'{death_count} deaths') 
-				
+			print(f'{len(dead)} deaths') 
 
-	# 1 means you live, 0 means you die
-	def idol_set(self, idol_count, p_len):
-		idols = numpy.zeros(p_len)
-		idols[:int(idol_count)] = 1
-		numpy.random.shuffle(idols)
-		return idols
-
-	def reap(self):
-		output = self.dead_P
-		self.dead_P = []
-		return output
+		return dead
 
+	# Picks the survivors of both sexes in one pass and returns the indices of everyone else (the dead).
+	#
+	# Everyone gets a random key in [0, 1), and we sort on sex + key so the females come first in a random order, then the males.
+	#   Within each sex the first idols people in that order live, which is the same uniform pick as shuffling a
+	#   zero/one array of idols per sex.
+	def idol_set(self, sexes, female_count, idols):
+		order = numpy.argsort( sexes + self.population.rng.random(len(sexes)), kind='stable' )
+		rank  = numpy.arange(len(sexes)) - numpy.where( sexes[order] == 0, 0, female_count )
+		return order[ rank >= numpy.array(idols, dtype=numpy.int64)[ sexes[order] ] ]
+
+	# Returns the ids of everyone who died aging out of this range and into the next one
 	def elapse_year(self, verbose=False):
 		if len(self.P) == 0:
-			return
-
-		for person in self.P:
-			person.grow()
-			
-		age_out = [ p for p in self.P if p.age > self.max_age ]
-		self.P = list( set(self.P) - set(age_out) )
-		self.population.P[ self.max_age + 1].age_in( age_out, verbose=verbose )
+			return None
+
+		if self.mode == PopulationType.COHORT:
+			runs, counts = self.P.shift()
+			if self.open:
+				self.P.add( 0, 0, runs[0] )
+				self.P.add( 0, 1, runs[1] )
+			elif counts.any():
+				return self.population.P[ self.max_age + 1 ].age_in( runs, counts.tolist(), verbose=verbose )
+			return None
+
+		# Individual.grow would call eval_maternity for every female here, but it doesn't do anything yet.
+		ages  = self.P.ages
+		ages += 1
+
+		age_out = ages > self.max_age
+		if age_out.any():
+			return self.population.P[ self.max_age + 1 ].age_in( *self.P.take(age_out), verbose=verbose )
 		
 
 	def __lt__(self, other):
 		return self.max_age < other.max_age
 
 	def by_sex(self):
-		f_sz = len( [i for i in self.people if i.is_female()] )
-		return f'{ f_sz } females and { len(self.P) - f_sz } males in { self }'
+		f_sz, m_sz = self.tally.tolist()
+		return f'{ f_sz } females and { m_sz } males in { self }'
 
 	def __str__(self, verbose=False):
 		if verbose:
-			return f'{ len(self.P) } aged { self.min_age } - { self.max_age } representing { self.mr + self.fr }% of the total population'
+			return f'{ len(self) } aged { self.min_age } - { self.max_age } representing { self.mr + self.fr }% of the total population'
 		else:
 			return f'<AgeRange { self.min_age } - { self.max_age } at { hex(id(self)) }>'
 
@@ -231,10 +474,47 @@ class AgeRange:
 	# DEPRECATED
 	# Number of people in this age range is greater than or equal to the total portion of the population that fits here
 	def isFull(self, theoretical=None):
-		return len(self.P) >= ( self.mr + self.fr ) / 100 * (theoretical if theoretical is not None else population.get_size())
-
+		return len(self) >= ( self.mr + self.fr ) / 100 * (theoretical if theoretical is not None else population.get_size())
+
+# Compiles an epoch's growth target into an array indexed by year offset, so trajectory[t] is how many people the curve
+#   wants t years after the event. b is the starting size. measured_time is the span the growth rate was measured over
+#   (see Parameter.roll), which both curves are fit against.
+#
+#   square root: passes through b at t = 0 and the linear growth line at t = measured_time
+#   logistic:    starts at b, levels off at carry_cap, and also meets the linear growth line at t = measured_time
+#   None:        the line itself
+#
+# Raises ValueError if the logistic curve can't be fit, e.g. when the line ends up above the carry capacity (see the
+#   notes on Savai'i's carry capacity in config.yaml).
+def growth_trajectory(years, curve=None, growth_rate=0, b=0, carry_cap=-1, measured_time=None):
+	x    = numpy.arange(int(years) + 1, dtype=numpy.float64)
+	line = lambda x: growth_rate * x + b
+
+	match curve:
+		case 'square root':
+			assert measured_time is not None
+			m = ( line(measured_time) - b ) / ( measured_time**0.5 )
+			return m * numpy.sqrt(x) + b
+		case 'logistic':
+			assert measured_time is not None
+			if b <= 0 or carry_cap <= b:
+				raise ValueError(f'Cannot fit a logistic curve from {b} people to a carry capacity of {carry_cap}')
+			if line(measured_time) <= 0 or line(measured_time) >= carry_cap:
+				raise ValueError(f'Cannot fit a logistic curve with carry capacity {carry_cap} through {line(measured_time)} people after {measured_time} years')
+
+			A  = (carry_cap - b) / b
+			m  = carry_cap / line(measured_time) - 1
+			m /= A
+			m  = math.log(m)
+			m /= -1 * measured_time
+
+			return carry_cap / (1 + A * numpy.exp( -1 * m * x ))
+		case _:
+			return line(x)
+
+# COHORT behaves like HISTORICAL but only keeps head counts per single-year age and sex (see Cohorts)
 class PopulationType(Enum):
-	HISTORICAL, SIMULATED = range(2)
+	HISTORICAL, SIMULATED, COHORT = range(3)
 
 class Population:
 
@@ -310,12 +590,20 @@ class Population:
 	#   I want a few key events that can vary in timing and also not vary in timing.  Gonna do that elsewhere though... 
 	
 
-	def __init__(self, target_sz=0, verbose=False, growth_rate=0, carry_cap=-1, mode=PopulationType.HISTORICAL):
+	# Pass ids to share an island's IdAllocator. Populations that only get merged into another one (see apply) must share it.
+	# rng is the numpy Generator every draw for this population (and its age ranges) comes from, see streams.py.
+	def __init__(self, target_sz=0, verbose=False, growth_rate=0, carry_cap=-1, mode=PopulationType.HISTORICAL, ids=None, rng=None):
 		# Here we're working to make every age of an age range collide with every other age of that range. So, 0 1 2 3 and 4 all point to one object. 
 		self.P = {}
 		self.mode = mode
-		for age_bracket in self.ddt.keys():
-			self.P.update(dict.fromkeys( list( range( age_bracket[0], int(age_bracket[1]) + 1 )), AgeRange(self, age_bracket, self.ddt[age_bracket]) ))
+		self.ids  = ids if ids is not None else IdAllocator()
+		self.rng  = rng if rng is not None else numpy.random.default_rng()
+		# SIMULATED only. Maps person id -> the AgeRange holding them, so lookups don't have to try every range.
+		self.index = {}
+		# Running (female, male) head counts, one row per age range from youngest to oldest. Every AgeRange updates its own row.
+		self.tallies = numpy.zeros( ( len(self.ddt), 2 ), dtype=numpy.int64 )
+		for slot, age_bracket in enumerate(self.ddt.keys()):
+			self.P.update(dict.fromkeys( list( range( age_bracket[0], int(age_bracket[1]) + 1 )), AgeRange(self, age_bracket, self.ddt[age_bracket], tally=self.tallies[slot]) ))
 
 		self.age_ranges = list(set(self.P.values()))
 		self.age_ranges.sort(reverse=True)
@@ -324,20 +612,27 @@ class Population:
 			portion = math.floor(target_sz * (ar.mr + ar.fr) / 100 )
 			if verbose:
 				print( f'Allocating {portion} to {ar}' )
-			for i in range(portion):
-				ar.new_individual(birth=False)
+			match self.mode:
+				case PopulationType.HISTORICAL | PopulationType.COHORT:
+					ar.populate(portion)
+				case PopulationType.SIMULATED:
+					for i in range(portion):
+						ar.new_individual(birth=False)
 
 		print( f'Generated population of { len(self) }' )
 		if verbose:
 			print(self)
 
 		match self.mode:
-			case PopulationType.HISTORICAL:
+			case PopulationType.HISTORICAL | PopulationType.COHORT:
 				# Birth Remainder. It's like death remainder. 
 				self.br = 0.0
 
 				self.growth_rate = growth_rate
 				self.carry_cap   = carry_cap
+				# Set by apply. Without a curve, growth is just growth_rate more people every year.
+				self.curve       = None
+				self.trajectory  = None
 				# Number of years of growth with the same growth rate and/or carry capacity. Resets in apply.
 				self.year        = 0
 			case PopulationType.SIMULATED:
@@ -346,21 +641,19 @@ class Population:
 	def __getitem__(self, key):
 		assert self.mode == PopulationType.SIMULATED
 
-		for ar in self.age_ranges:
-			try:
-				return ar[key]
-			except KeyError:
-				pass
-
-		return None
+		ar = self.index.get(key)
+		return None if ar is None else ar[key]
 
 	def __setitem__(self, pid, person):
 		assert self.mode == PopulationType.SIMULATED
 
+		# Storing someone again (e.g. at a new age) mustn't leave the old copy behind in its range
+		if pid in self.index:
+			del self.index[pid][pid]
 		self.P[person.age][pid] = person
 
 	def __len__(self):
-		return sum( map( lambda ar: len( ar.P ), self.age_ranges ) )
+		return int(self.tallies.sum())
 
 	def __str__(self):
 		return f'{os.linesep.join( [ ar.by_sex() for ar in self.age_ranges ] ) }'
@@ -374,16 +667,31 @@ class Population:
 				self.P[p.age].append(p)
 		elif type(other) == Individual:
 			self.P[other.age].append(other) 
+		elif type(other) == Population:
+			# Both populations are built from the same demography table, so their age ranges line up one to one
+			assert self.mode == other.mode
+			for mine, theirs in zip(self.age_ranges, other.age_ranges):
+				match self.mode:
+					case PopulationType.HISTORICAL:
+						mine.P.extend(theirs.P.ids, theirs.P.ages, theirs.P.sexes)
+					case PopulationType.COHORT:
+						for offset, cell in enumerate(theirs.P.runs):
+							for sex, runs in enumerate(cell):
+								mine.P.add(offset, sex, runs)
+					case PopulationType.SIMULATED:
+						for p in theirs.people:
+							mine.append(p)
 
 		return self
 
 	def __contains__(self, p):
 		match self.mode:
 			case PopulationType.HISTORICAL:
-				# I have not tested this!
-				return p in iter(self)
+				return any( p.id in ar.P.ids for ar in self.age_ranges )
 			case PopulationType.SIMULATED:
-				return self[p.id] is not None
+				return p.id in self.index
+			case PopulationType.COHORT:
+				return any( p.id in ar.P for ar in self.age_ranges )
 
 	def set_historical(self):
 		self.set_mode(PopulationType.HISTORICAL)
@@ -396,6 +704,7 @@ class Population:
 			return
 
 		warnings.warn('WARNING: set_mode currently erases all extant population data')
+		self.index = {}
 
 		match mode:
 			case PopulationType.HISTORICAL:
@@ -406,18 +715,25 @@ class Population:
 				self.mode = PopulationType.SIMULATED
 				for ar in self.age_ranges:
 					ar.set_simulated_mode()
+			case PopulationType.COHORT:
+				self.mode = PopulationType.COHORT
+				for ar in self.age_ranges:
+					ar.set_cohort_mode()
 
 	def kill(self, pid):
 		assert self.mode == PopulationType.SIMULATED
-		assert self[pid] is not None
+		assert pid in self.index
 
-		for ar in self.age_ranges:
-			try:
-				person = ar[pid]
-				del ar[pid]
-				return person
-			except KeyError:
-				pass
+		ar = self.index[pid]
+		person = ar[pid]
+		del ar[pid]
+		return person
+
+	def set_age(self, person, age):
+		old_age = person.age
+		person.set_age(age)
+		if self.mode == PopulationType.SIMULATED:
+			self.validate_age_range(person, old_age)
 
 	# Re-place a person in their appropriate age range, if they've aged
 	def validate_age_range(self, person, old_age):
@@ -433,7 +749,10 @@ class Population:
 	#   population change: create a temp population and just add it to this one.
 	#   growth rate change: if an event lacks the 'curve' property, this just sets the property. But if it has the curve property,
 	#     we want to set up a function which will fit population size at year t to a curve.
-	def apply(self, event, curve=None):
+	#
+	# years is how long this event's epoch lasts. The growth target for the whole epoch gets compiled into self.trajectory
+	#   up front (see growth_trajectory), which also means a curve that can't be fit fails here instead of mid-run.
+	def apply(self, event, curve=None, years=None):
 		try:
 			event.params['Population Change'].convert('raw')
 		except KeyError:
@@ -453,47 +772,43 @@ class Population:
 				case 'Carry Capacity':
 					self.carry_cap = param.value
 				case 'Population Change':
-					tmp_pop = Population( event.params['Population Change'].value )
+					tmp_pop = Population( event.params['Population Change'].value, ids=self.ids, mode=self.mode, rng=self.rng )
 					self   += tmp_pop
+					# Kept around so the History can give just these people birth records
+					self.arrivals = tmp_pop
 				case 'Growth Rate':
 					self.growth_rate = param.value
 
-					match event.curve:
-						case 'square root':
-							# Linear function
-							assert hasattr(event.params['Growth Rate'], 'measured_time')
-							time = event.params['Growth Rate'].measured_time
-							b    = event.params['Population Change'].value
-							line = lambda x: self.growth_rate * x + b
-
-							# Nonlinear fit
-							m    = ( line(time) - b ) / ( time**0.5 ) 
-							self.population_curve = lambda x: m * (x**0.5) + b
-
-						case 'logistic':
-							# Linear function
-							assert hasattr(event.params['Growth Rate'], 'measured_time')
-							time = event.params['Growth Rate'].measured_time
-							b = len(self)
-							line = lambda x: self.growth_rate * x + b
-
-							# Nonlinear fit
-							A  = (self.carry_cap - b) / b
-							m  = self.carry_cap / line(time) - 1
-							m /= A
-							m  = math.log(m)
-							m /= -1 * time
-
-							self.population_curve = lambda x: self.carry_cap / (1 + A * ( math.e**( -1 * m * x ) ) )
-							
+		self.curve = event.curve
+		self.trajectory_args = {
+			'curve': event.curve,
+			'growth_rate': self.growth_rate,
+			# The square root fit starts from the size of the population change, the others from wherever we are now
+			'b': event.params['Population Change'].value if event.curve == 'square root' else len(self),
+			'carry_cap': self.carry_cap,
+			'measured_time': getattr(event.params['Growth Rate'], 'measured_time', None)
+		}
+		self.trajectory = growth_trajectory( years if years is not None else self.trajectory_args['measured_time'] or 0, **self.trajectory_args )
 
 	@property
 	def growth(self):
-		if hasattr(self, "population_curve"):
-			return self.population_curve(self.year) 
-		else:
+		if self.curve is None:
 			return self.growth_rate + len(self)
 
+		# Only if we run past the years given to apply
+		if self.year >= len(self.trajectory):
+			self.trajectory = growth_trajectory( 2 * self.year, **self.trajectory_args )
+
+		return self.trajectory[self.year]
+
+	# Every living person's (ids, ages, sexes) as flat arrays, without building any Individuals
+	def arrays(self):
+		match self.mode:
+			case PopulationType.HISTORICAL:
+				return tuple( numpy.concatenate( [ getattr(ar.P, field) for ar in self.age_ranges ] ) for field in ['ids', 'ages', 'sexes'] )
+			case PopulationType.COHORT:
+				return tuple( map( numpy.concatenate, zip(*( ar.P.arrays(ar.min_age) for ar in self.age_ranges )) ) )
+
 	def flattened_P(self):
 		return [individual for age_range in self.age_ranges for individual in age_range]
 		#match self.mode:
@@ -502,6 +817,23 @@ class Population:
 		#	case PopulationType.SIMULATED:
 		#		return [individual for age_range in self.age_ranges for individual in age_range.values()]
 
+	# Stats off the running tallies, so none of these look at a single person
+
+	# Head counts as a (age ranges x 2) array, youngest range first, columns (female, male)
+	def pyramid(self):
+		return self.tallies.copy()
+
+	def sex_counts(self):
+		f_sz, m_sz = self.tallies.sum(axis=0).tolist()
+		return { 'female': f_sz, 'male': m_sz }
+
+	def bracket_counts(self):
+		return { ( ar.min_age, ar.max_age ): tuple(ar.tally.tolist()) for ar in reversed(self.age_ranges) }
+
+	# One line, youngest first, like 0-4:178/169 5-9:169/135 ...
+	def pyramid_str(self):
+		return ' '.join( f'{ ar.min_age }-{ ar.max_age if not ar.open else "" }:{ ar.tally[0] }/{ ar.tally[1] }' for ar in reversed(self.age_ranges) )
+
 	def print_statistics(self):
 		for ar in self.age_ranges:
 			print(ar.by_sex())
@@ -511,8 +843,9 @@ class Population:
 		for _ in range(count):
 			self.elapse_year()
 
-	# I want this to return a hash that looks like:
-	# { births: [ { id: person.id, sex: person.sex }... ], deaths: [] } 
+	# This returns a hash that looks like:
+	# { births: { id: [ person.id... ], sex: [ person.sex... ] }, deaths: [ person.id... ] }
+	#   where every list is a numpy array, and births' id and sex line up.
 	def elapse_year(self, verbose=False):
 		self.year += 1
 		# We do this up here because the death block modifies the population in-place, so len(self) changes.
@@ -522,17 +855,15 @@ class Population:
 			print(f'{self.year}: {new_people}')
 
 		# Death Block
-		cemetery = []
+		cemetery = [ numpy.empty(0, dtype=numpy.int64) ]
 
 		for ar in self.age_ranges:
 			if verbose:
 				print(f'Growing {ar}')
-			ar.elapse_year(verbose=verbose)
-
-		# We accumulate all the dead people in a separate loop bc each iteration above piles dead bodies in the next age range up
-		#   but we process in reverse order so we never actually see the bodies. Oops! 
-		for ar in self.age_ranges:
-			cemetery += ar.reap()
+			dead = ar.elapse_year(verbose=verbose)
+			if dead is not None:
+				cemetery.append(dead)
+		cemetery = numpy.concatenate(cemetery)
 
 		if verbose:
 			print(f'{len(cemetery)} deaths')
@@ -544,13 +875,10 @@ class Population:
 		self.br, extra = math.modf(self.br)
 		births += int(extra)	
 	
-		baby_ar = self.age_ranges[-1]
-		birth_data = []
-		for _ in range(births):
-			baby = baby_ar.new_individual()
-			birth_data.append( { 'id': baby.id, 'sex': baby.sex } )
+		# A shrinking target can ask for fewer births than deaths, but never fewer than none
+		ids, sexes = self.age_ranges[-1].births( max(births, 0) )
 
-		return { 'births': birth_data, 'deaths': [ p.id for p in cemetery ] }
+		return { 'births': { 'id': ids, 'sex': sexes }, 'deaths': cemetery }
 
 	# DEPRECATED
 	def oldest_available_age(self, target_size):
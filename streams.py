@@ -0,0 +1,21 @@
+# Where every random draw comes from. One master seed is all it takes to reproduce a run, however it's split up.
+#
+# Each island gets its own independent numpy Generators for each replicate, one per stream below. They're derived from
+#   the master seed with SeedSequence spawn keys of (replicate, island, stream), the same keys SeedSequence.spawn hands
+#   out, except picked by name rather than by the order things were spawned in. That way a stream never depends on which
+#   worker ran it, how many there were, or what else ran first. The island part of the key is a crc32 of its name.
+#
+# Without a seed everything still gets its own Generator, just from fresh OS entropy.
+import zlib
+import numpy as np
+
+# Rolling the event parameters, and running the history
+PARAMETERS, HISTORY = range(2)
+
+def seed_sequence(seed, island, stream, replicate=0):
+	return np.random.SeedSequence( seed, spawn_key=( replicate, zlib.crc32( island.encode() ), stream ) )
+
+def generator(seed, island, stream, replicate=0):
+	if seed is None:
+		return np.random.default_rng()
+	return np.random.default_rng( seed_sequence(seed, island, stream, replicate) )